@@ -1,13 +1,24 @@
+import os
+import re
+import sys
+import asyncio
 import streamlit as st
-import time
-from src.orchestrator import run_collaboration
-from src.llm import warm_up
 
 # ---------------- PAGE CONFIG ----------------
 st.set_page_config(page_title="🎭 Multi-Agent Debate", layout="centered")
 
-# Warm up the model once
-warm_up("llama3")
+# ---------------- BOOTSTRAP ----------------
+# src.* pulls in FAISS, sentence-transformers and torch; import it on first use
+# (once per process) so the page paints before the heavy stack loads.
+@st.cache_resource
+def _bootstrap():
+    from src.orchestrator import arun_collaboration
+    from src.llm import warm_up, MODEL, SMALL_MODEL
+
+    # Warm up both models (Round 1 on MODEL, short turns on SMALL_MODEL)
+    warm_up(MODEL)
+    warm_up(SMALL_MODEL)
+    return arun_collaboration
 
 # ---------------- COLORS ----------------
 BACKGROUND = "#000000"
@@ -18,13 +29,18 @@ RATIONALIST_COLOR = "#2e7d32"
 DRAMATIST_COLOR = "#8e24aa"
 SYNTHESIS_COLOR = "#0d9488"
 
+# speaker name -> bubble css class (unknown speakers fall back to dramatist)
+CSS_FOR = {"Commander": "commander", "Rationalist": "rationalist", "Dramatist": "dramatist"}
+
 # ---------------- STYLES ----------------
-st.markdown(
-    f"""
+@st.cache_resource
+def _css_block(bg: str, text: str, box: str, cmd: str, rat: str, dra: str, syn: str) -> str:
+    # built once per process instead of re-formatting on every rerun
+    return f"""
     <style>
       .stApp {{
-        background-color: {BACKGROUND};
-        color: {TEXT_COLOR} !important;
+        background-color: {bg};
+        color: {text} !important;
       }}
 
       .block-container {{
@@ -33,8 +49,8 @@ st.markdown(
       }}
 
       .bubble {{
-        background: {BOX_COLOR};
-        color: {TEXT_COLOR};
+        background: {box};
+        color: {text};
         border-radius: 14px;
         padding: 12px 16px;
         margin: 8px 0;
@@ -43,15 +59,20 @@ st.markdown(
       }}
 
       .user {{ border-left-color: #888; }}
-      .commander {{ border-left-color: {COMMANDER_COLOR}; }}
-      .rationalist {{ border-left-color: {RATIONALIST_COLOR}; }}
-      .dramatist {{ border-left-color: {DRAMATIST_COLOR}; }}
-      .synthesis {{ border-left-color: {SYNTHESIS_COLOR}; }}
+      .commander {{ border-left-color: {cmd}; }}
+      .rationalist {{ border-left-color: {rat}; }}
+      .dramatist {{ border-left-color: {dra}; }}
+      .synthesis {{ border-left-color: {syn}; }}
+      .pending {{ margin-top: -6px; opacity: 0.85; }}
 
-      h3, h4 {{ color: {TEXT_COLOR}; }}
+      h3, h4 {{ color: {text}; }}
       .caption small {{ color: #aaa !important; }}
     </style>
-    """,
+    """
+
+st.markdown(
+    _css_block(BACKGROUND, TEXT_COLOR, BOX_COLOR, COMMANDER_COLOR,
+               RATIONALIST_COLOR, DRAMATIST_COLOR, SYNTHESIS_COLOR),
     unsafe_allow_html=True,
 )
 
@@ -62,6 +83,73 @@ st.markdown(
     "each offering unique perspectives — followed by a **consensus synthesis**."
 )
 
+# ---------------- SEMANTIC CACHE ----------------
+@st.cache_resource
+def _semantic_cache():
+    # shared across sessions; near-duplicate questions skip every LLM call
+    from src.semantic_cache import SemanticCache
+    return SemanticCache(path=os.getenv("SEMANTIC_CACHE_PATH", "data/cache/semantic_cache.pkl"))
+
+def _cacheable(result: dict) -> bool:
+    # never pin a graph failure / fallback run in the cache: canned text would keep
+    # being served for similar questions after Ollama recovers
+    synth = result.get("synthesis") or {}
+    return (bool(result.get("round1")) and not result.get("degraded")
+            and "(Graph error" not in (synth.get("response") or ""))
+
+# ---------------- LIVE ROUND 1 ----------------
+ROUND1_BUBBLES = [
+    ("commander", "🧭 Commander", "commander"),
+    ("rationalist", "🧠 Rationalist", "rationalist"),
+    ("dramatist", "🎭 Dramatist", "dramatist"),
+]
+
+# a finished block: paragraph break or sentence end followed by whitespace
+_BLOCK_END = re.compile(r"\n\n|[.!?][\"')\]]?\s")
+
+class LiveRound1:
+    """
+    Renders Round-1 tokens into per-agent bubbles as Ollama streams them.
+    Each bubble has a committed part (re-rendered only when a sentence or
+    paragraph completes) and a small pending tail updated per token, so the
+    markdown work stays linear in the response length.
+    """
+
+    def __init__(self, container):
+        self.slots = {}
+        for key, label, css in ROUND1_BUBBLES:
+            self.slots[key] = {
+                "label": label, "css": css,
+                "committed": "", "pending": "",
+                "ph_committed": container.empty(),
+                "ph_pending": container.empty(),
+            }
+
+    def update(self, key: str, delta: str):
+        slot = self.slots.get(key)
+        if slot is None:
+            return
+        slot["pending"] += delta
+        last = None
+        for last in _BLOCK_END.finditer(slot["pending"]):
+            pass
+        if last:
+            cut = last.end()
+            slot["committed"] += slot["pending"][:cut]
+            slot["pending"] = slot["pending"][cut:]
+            slot["ph_committed"].markdown(
+                f"<div class='bubble {slot['css']}'><b>{slot['label']}:</b> {slot['committed']}</div>",
+                unsafe_allow_html=True,
+            )
+        if not slot["pending"]:
+            slot["ph_pending"].empty()
+            return
+        head = "" if slot["committed"] else f"<b>{slot['label']}:</b> "
+        slot["ph_pending"].markdown(
+            f"<div class='bubble {slot['css']} pending'>{head}{slot['pending']}</div>",
+            unsafe_allow_html=True,
+        )
+
 # ---------------- SESSION STATE ----------------
 if "history" not in st.session_state:
     st.session_state.history = []
@@ -71,48 +159,44 @@ query = st.chat_input("Ask a question...")
 
 # ---------------- RUN COLLAB ----------------
 if query:
-    with st.spinner("🤔 Agents are thinking…"):
-        result = run_collaboration(query, dialogue_rounds=1)
+    arun_collaboration = _bootstrap()
+    cache = _semantic_cache()
+    result = cache.get(query)
+    if result is None:
+        live = st.empty()
+        with live.container():
+            st.markdown(f"<div class='bubble user'><b>🧑 You:</b> {query}</div>", unsafe_allow_html=True)
+            st.markdown("### 🗣️ Round 1 — Individual Viewpoints")
+            stream = LiveRound1(st)
+            with st.spinner("🤔 Agents are thinking…"):
+                result = asyncio.run(arun_collaboration(query, dialogue_rounds=1, on_token=stream.update))
+        live.empty()  # the full transcript is rendered from history below
+        if _cacheable(result):
+            cache.put(query, result)
     st.session_state.history.append((query, result))
 
-# ---------------- TYPE EFFECT ----------------
-def type_out(container, html, animate=True):
-    if not animate:
-        container.markdown(html, unsafe_allow_html=True)
-        return
-    ph = container.empty()
-    acc = ""
-    for ch in html:
-        acc += ch
-        ph.markdown(acc, unsafe_allow_html=True)
-        time.sleep(0.006)
-
 # ---------------- CLEAR HISTORY BUTTON ----------------
 col_clear, _ = st.columns([1, 6])
 with col_clear:
     if st.button("Clear history"):
         st.session_state.history = []
+        if "src.retriever" in sys.modules:  # nothing to clear before the first query
+            sys.modules["src.retriever"].clear_cache()
 
 # ---------------- DISPLAY ----------------
-for i, (q, res) in enumerate(st.session_state.history):
-    is_last = (i == len(st.session_state.history) - 1)
-
+for q, res in st.session_state.history:
     # ---------- USER ----------
-    type_out(st, f"<div class='bubble user'><b>🧑 You:</b> {q}</div>", animate=is_last)
+    st.markdown(f"<div class='bubble user'><b>🧑 You:</b> {q}</div>", unsafe_allow_html=True)
 
     # ---------- ROUND 1 ----------
     st.markdown("### 🗣️ Round 1 — Individual Viewpoints")
     round1 = res.get("round1", {})
-    for key, label, css in [
-        ("commander", "🧭 Commander", "commander"),
-        ("rationalist", "🧠 Rationalist", "rationalist"),
-        ("dramatist", "🎭 Dramatist", "dramatist"),
-    ]:
+    for key, label, css in ROUND1_BUBBLES:
         if key in round1:
             msg = round1[key].get("response", "")
             cits = round1[key].get("citations", "")
             html = f"<div class='bubble {css}'><b>{label}:</b> {msg}</div>"
-            type_out(st, html, animate=is_last)
+            st.markdown(html, unsafe_allow_html=True)
             if cits:
                 st.caption(f"🔗 {cits}")
 
@@ -122,13 +206,7 @@ for i, (q, res) in enumerate(st.session_state.history):
         for turn in res["dialogue"]:
             who = turn.get("speaker", "")
             msg = turn.get("message", "")
-            css = (
-                "commander"
-                if "Commander" in who
-                else "rationalist"
-                if "Rationalist" in who
-                else "dramatist"
-            )
+            css = CSS_FOR.get(who, "dramatist")
             st.markdown(
                 f"<div class='bubble {css}'><b>{who}:</b> {msg}</div>",
                 unsafe_allow_html=True,
@@ -0,0 +1,40 @@
+# src/agents/_thread_utils.py
+from __future__ import annotations
+from itertools import islice
+from typing import Any, Iterable, Optional, Tuple
+
+
+def unpack_turn(x) -> Tuple[str, str]:
+    """Return (speaker, message) from a thread item (dict or (speaker, msg))."""
+    if isinstance(x, dict):
+        return x.get("speaker", ""), x.get("message", "")
+    if isinstance(x, (list, tuple)) and len(x) >= 2:
+        return str(x[0]), str(x[1])
+    return "", ""
+
+
+def clip(s: str, n: int = 220) -> str:
+    s = (s or "").strip().replace("\n", " ")
+    return s if len(s) <= n else s[: n - 1] + "…"
+
+
+def recent_as_text(thread: Iterable[Any], n: int = 3, clip_to: Optional[int] = None) -> str:
+    """
+    Last `n` turns as "Speaker: message" lines. `thread` may be a list or the
+    graph's bounded deque; only the tail is walked, never the whole transcript.
+    """
+    tail = list(islice(reversed(thread), n))[::-1]
+    lines = []
+    for t in tail:
+        spk, msg = unpack_turn(t)
+        lines.append(f"{spk}: {clip(msg, clip_to) if clip_to else msg}")
+    return "\n".join(lines)
+
+
+def last_other_speaker(thread: Iterable[Any], me: str) -> Optional[str]:
+    """Return the most recent speaker in thread that isn't `me`."""
+    for t in reversed(thread):
+        spk, _ = unpack_turn(t)
+        if spk and spk != me:
+            return spk
+    return None
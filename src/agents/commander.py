@@ -1,35 +1,61 @@
 # src/agents/commander.py
 from __future__ import annotations
-from typing import Any, Dict, List, Tuple
+import asyncio
+from typing import Any, Dict, Iterable, List, Tuple
 
-from src.retriever import PersonaRetriever
-from src.llm import chat
+from src.retriever import get_retriever
+from src.llm import chat, achat, warn_if_short, MODEL, SMALL_MODEL
+from src.agents.prompts import SHARED_PREAMBLE
 from src.citations import format_citations
-
-
-# ------- small helpers (match Rationalist’s robustness) -------
-def _unpack_turn(x) -> Tuple[str, str]:
-    """Return (speaker, message) from a thread item (dict or (speaker, msg))."""
-    if isinstance(x, dict):
-        return x.get("speaker", ""), x.get("message", "")
-    if isinstance(x, (list, tuple)) and len(x) >= 2:
-        return str(x[0]), str(x[1])
-    return "", ""
-
-
-def _clip(s: str, n: int = 220) -> str:
-    s = (s or "").strip().replace("\n", " ")
-    return s if len(s) <= n else s[: n - 1] + "…"
-
-
-def _last_three_as_text(thread: List[Any]) -> str:
-    recent = thread[-3:] if len(thread) >= 3 else thread
-    lines: List[str] = []
-    for t in recent:
-        spk, msg = _unpack_turn(t)
-        lines.append(f"{spk}: {_clip(msg)}")
-    return "\n".join(lines)
-
+from src.agents._thread_utils import recent_as_text, last_other_speaker
+
+
+# ---- system prompts (module-level so every call sends a byte-identical prefix) ----
+SYSTEM_RESPOND = SHARED_PREAMBLE + (
+    "You are CommanderAgent.\n"
+    "Voice: authoritative, confident, and pragmatic — like a leader giving direct orders.\n"
+    "Tone: short, declarative sentences that inspire confidence and urgency.\n"
+    "Round 1 goal (4–5 sentences):\n"
+    "- Identify the crux of the situation in plain, human language.\n"
+    "- State **one or two decisive actions** that move the user forward immediately.\n"
+    "- Include a short checkpoint or timeline (e.g., 'by end of week').\n"
+    "Constraints:\n"
+    "- Speak directly to 'you' (never say 'User').\n"
+    "- Avoid empathy filler like 'I understand'; focus on clarity and direction.\n"
+    "- Do NOT list steps or bullets — use flowing sentences.\n"
+    "- Never hedge with 'might' or 'maybe'; use verbs like 'Decide', 'Clarify', 'Commit'.\n"
+    "- Use at most one citation if it sharpens a line, otherwise omit citations.\n"
+)
+
+SYSTEM_REBUTTAL = SHARED_PREAMBLE + (
+    "You are CommanderAgent.\n"
+    "Write a short rebuttal (2–4 sentences).\n"
+    "Acknowledge one fair point from Rationalist, correct one over-constraint, "
+    "and end by committing to a concrete next step or check-in.\n"
+    "Stay confident, grounded, and concise.\n"
+)
+
+SYSTEM_CONVERSE = SHARED_PREAMBLE + (
+    "You are CommanderAgent.\n"
+    "Voice: firm, clear, and human — you sound like a capable leader guiding peers.\n"
+    "Your task: respond naturally to the last message, not like a bot.\n"
+    "Rules:\n"
+    "- React directly to the last speaker’s point — agree, challenge, or redirect.\n"
+    "- Give 2–4 crisp sentences of action-oriented reasoning.\n"
+    "- Avoid repeating earlier advice.\n"
+    "- No meta phrases like 'Task:' or 'Action:'.\n"
+    "- If you @mention someone, use exactly one (@Commander/@Rationalist/@Dramatist).\n"
+    "Tone: decisive, forward-leaning, human.\n"
+)
+
+# system messages are built once; each call only allocates its user message
+_SYS_RESPOND_MSG  = {"role": "system", "content": SYSTEM_RESPOND}
+_SYS_REBUTTAL_MSG = {"role": "system", "content": SYSTEM_REBUTTAL}
+_SYS_CONVERSE_MSG = {"role": "system", "content": SYSTEM_CONVERSE}
+
+_USER_RESPOND  = "User query:\n{query}\n\nOptional grounding quotes:\n{context}"
+_USER_REBUTTAL = "Rationalist said:\n{statement}\n\nYour rebuttal:"
+_USER_CONVERSE = "User query:\n{query}\n\nRecent thread:\n{history}\n\nProduce your reply now."
 
 class CommanderAgent:
     """
@@ -37,14 +63,18 @@ class CommanderAgent:
     - respond(): concise, human, directive guidance (no bullet lists or boilerplate).
     - converse(): reacts to the latest turn, accepts/rejects a point, adjusts course (2–4 sentences).
     - rebuttal(): short counter to Rationalist (2–4 sentences).
+    arespond()/arebuttal() are the async twins used by the graph's concurrent fan-out.
     """
 
-    def __init__(self, model: str = "llama3"):
-        self.retriever = PersonaRetriever("commander")
+    def __init__(self, model: str = MODEL, small_model: str = SMALL_MODEL, cache=None):
+        self.retriever = get_retriever("commander")
         self.model = model
+        self.small_model = small_model
+        self.cache = cache              # optional per-persona SemanticCache for respond()
 
     # ---------- Round 1 ----------
-    def respond(self, query: str) -> Dict[str, Any]:
+    def _respond_prompt(self, query: str) -> Tuple[List[Dict[str, Any]], List[Dict[str, str]]]:
+        """Retrieve grounding hits and build the Round-1 messages."""
         # Retrieval biased toward operational language
         aug_query = (
             f"{query} resolve escalate checkpoint scope metric deadline SLA remediation owner"
@@ -56,44 +86,11 @@ class CommanderAgent:
             for h in hits
         )
 
-        system = (
-            "You are CommanderAgent.\n"
-            "Voice: authoritative, confident, and pragmatic — like a leader giving direct orders.\n"
-            "Tone: short, declarative sentences that inspire confidence and urgency.\n"
-            "Round 1 goal (4–5 sentences):\n"
-            "- Identify the crux of the situation in plain, human language.\n"
-            "- State **one or two decisive actions** that move the user forward immediately.\n"
-            "- Include a short checkpoint or timeline (e.g., 'by end of week').\n"
-            "Constraints:\n"
-            "- Speak directly to 'you' (never say 'User').\n"
-            "- Avoid empathy filler like 'I understand'; focus on clarity and direction.\n"
-            "- Do NOT list steps or bullets — use flowing sentences.\n"
-            "- Never hedge with 'might' or 'maybe'; use verbs like 'Decide', 'Clarify', 'Commit'.\n"
-            "- Use at most one citation if it sharpens a line, otherwise omit citations.\n"
-        )
-
-        user = (
-            f"User query:\n{query}\n\n"
-            f"Optional grounding quotes:\n{context if context else '(none)'}"
-        )
+        user = _USER_RESPOND.format(query=query, context=context or "(none)")
+        return hits, [_SYS_RESPOND_MSG, {"role": "user", "content": user}]
 
-        resp_text = chat(
-            model=self.model,
-            messages=[{"role": "system", "content": system},
-                      {"role": "user",   "content": user}],
-            options={"temperature": 0.22, "num_predict": 220},
-            stream=False,
-        ).strip()
-        if len(resp_text) < 30:  # retry once with non-stream + larger budget
-            resp_text = chat(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system},
-                    {"role": "user",   "content": user},
-                ],
-                options={"temperature": 0.2, "num_predict": 384},
-                stream=False
-            ).strip()
+    @staticmethod
+    def _respond_result(resp_text: str, hits: List[Dict[str, Any]]) -> Dict[str, Any]:
         # At most one concise citation; otherwise blank
         citations = format_citations(hits[:1])
         return {
@@ -102,85 +99,99 @@ class CommanderAgent:
             "hits": hits,
         }
 
+    def respond(self, query: str) -> Dict[str, Any]:
+        if self.cache is not None and (hit := self.cache.get(query)) is not None:
+            return dict(hit)
+        hits, messages = self._respond_prompt(query)
+        resp_text = chat(
+            model=self.model,
+            messages=messages,
+            options={"temperature": 0.22, "num_predict": 320},
+            stream=False,
+        ).strip()
+        warn_if_short(resp_text, "Commander.respond")
+        result = self._respond_result(resp_text, hits)
+        if self.cache is not None and resp_text:
+            self.cache.put(query, result)
+        return result
+
+    async def arespond(self, query: str, on_token=None) -> Dict[str, Any]:
+        """Async respond(); streams deltas to `on_token` as Ollama decodes them."""
+        if self.cache is not None:
+            hit = await asyncio.to_thread(self.cache.get, query)
+            if hit is not None:
+                if on_token:
+                    on_token(hit["response"])
+                return dict(hit)
+        # retrieval is CPU/disk bound; keep it off the event loop
+        hits, messages = await asyncio.to_thread(self._respond_prompt, query)
+        resp_text = (await achat(
+            model=self.model,
+            messages=messages,
+            options={"temperature": 0.22, "num_predict": 320},
+            stream=True,
+            on_token=on_token,
+        )).strip()
+        warn_if_short(resp_text, "Commander.arespond")
+        result = self._respond_result(resp_text, hits)
+        if self.cache is not None and resp_text:
+            await asyncio.to_thread(self.cache.put, query, result)
+        return result
+
     # ---------- Rebuttal to Rationalist ----------
+    @staticmethod
+    def _rebuttal_prompt(statement: str) -> List[Dict[str, str]]:
+        return [_SYS_REBUTTAL_MSG,
+                {"role": "user", "content": _USER_REBUTTAL.format(statement=statement)}]
+
     def rebuttal(self, statement: str) -> Dict[str, Any]:
         """
         Short, crisp rebuttal to Rationalist: acknowledge a fair point,
         flag one over-constraint, and commit to the next clarity step.
         2–4 sentences, no lists.
         """
-        system = (
-            "You are CommanderAgent.\n"
-            "Write a short rebuttal (2–4 sentences).\n"
-            "Acknowledge one fair point from Rationalist, correct one over-constraint, "
-            "and end by committing to a concrete next step or check-in.\n"
-            "Stay confident, grounded, and concise.\n"
-        )
-        user = f"Rationalist said:\n{statement}\n\nYour rebuttal:"
+        messages = self._rebuttal_prompt(statement)
 
         txt = chat(
-            self.model,
-            [{"role": "system", "content": system},
-             {"role": "user", "content": user}],
-            options={"temperature": 0.25, "num_predict": 220},
+            self.small_model,
+            messages,
+            options={"temperature": 0.25, "num_predict": 160},
             stream=False,
         ).strip()
+        warn_if_short(txt, "Commander.rebuttal")
+        return {"response": txt, "citations": ""}
 
-        if len(txt) < 30:
-            # fallback (non-stream) if the streamed output is too short
-            txt = chat(
-                self.model,
-                [{"role": "system", "content": system},
-                 {"role": "user", "content": user}],
-                options={"temperature": 0.25, "num_predict": 360},
-                stream=False,
-            ).strip()
+    async def arebuttal(self, statement: str) -> Dict[str, Any]:
+        messages = self._rebuttal_prompt(statement)
 
+        txt = (await achat(
+            self.small_model,
+            messages,
+            options={"temperature": 0.25, "num_predict": 160},
+            stream=False,
+        )).strip()
+        warn_if_short(txt, "Commander.arebuttal")
         return {"response": txt, "citations": ""}
 
     # ---------- Live Dialogue ----------
-    def converse(self, query: str, thread: List[Any]) -> Dict[str, Any]:
+    def converse(self, query: str, thread: Iterable[Any]) -> Dict[str, Any]:
         """
         Respond to the latest point without repeating Round-1 advice.
         Accept or reject one point, state what happens next. 2–4 sentences.
         If you @mention, use exactly one of: @Commander / @Rationalist / @Dramatist.
         """
-        history = _last_three_as_text(thread)
-
-        system = (
-            "You are CommanderAgent.\n"
-            "Voice: firm, clear, and human — you sound like a capable leader guiding peers.\n"
-            "Your task: respond naturally to the last message, not like a bot.\n"
-            "Rules:\n"
-            "- React directly to the last speaker’s point — agree, challenge, or redirect.\n"
-            "- Give 2–4 crisp sentences of action-oriented reasoning.\n"
-            "- Avoid repeating earlier advice.\n"
-            "- No meta phrases like 'Task:' or 'Action:'.\n"
-            "- If you @mention someone, use exactly one (@Commander/@Rationalist/@Dramatist).\n"
-            "Tone: decisive, forward-leaning, human.\n"
-        )
-        user = f"User query:\n{query}\n\nRecent thread:\n{history}\n\nProduce your reply now."
+        history = recent_as_text(thread, n=3, clip_to=220)
+        user = _USER_CONVERSE.format(query=query, history=history)
 
         txt = chat(
-            self.model,
-            [{"role": "system", "content": system},
-             {"role": "user", "content": user}],
-            options={"temperature": 0.25, "num_predict": 220},
+            self.small_model,
+            [_SYS_CONVERSE_MSG, {"role": "user", "content": user}],
+            options={"temperature": 0.25, "num_predict": 320},
             stream=False,
         ).strip()
+        warn_if_short(txt, "Commander.converse")
 
-        if len(txt) < 30:
-            # fallback retry (non-stream) if streamed content is oddly short
-            reminder = "\n\nReminder: keep it human, decisive, and avoid repeating earlier advice."
-            txt = chat(
-                self.model,
-                [{"role": "system", "content": system},
-                 {"role": "user", "content": user + reminder}],
-                options={"temperature": 0.25, "num_predict": 360},
-                stream=False,
-            ).strip()
-        last_other = next((t["speaker"] for t in reversed(thread)
-                   if t.get("speaker") and t["speaker"] != "Commander"), None)
+        last_other = last_other_speaker(thread, me="Commander")
         if last_other and "@Commander" in txt:
             txt = txt.replace("@Commander", f"@{last_other}", 1)
         # No citations in live dialogue to keep bubbles clean
@@ -1,34 +1,71 @@
 # src/agents/dramatist.py
-from src.retriever import PersonaRetriever
-from src.llm import chat
-
-def _last_two(thread):
-    """Return (speaker, message) pairs robustly from thread list of tuples or dicts."""
-    last = thread[-1]
-    prev = thread[-2] if len(thread) > 1 else ("", "")
-
-    def unpack(x):
-        if isinstance(x, dict):
-            return x.get("speaker", ""), x.get("message", "")
-        elif isinstance(x, (list, tuple)) and len(x) >= 2:
-            return x[0], x[1]
-        return "", ""
-
-    def clip(s, n=220):
-        s = (s or "").strip().replace("\n", " ")
-        return s if len(s) <= n else s[:n] + "…"
-
-    last_spk, last_msg = unpack(last)
-    prev_spk, prev_msg = unpack(prev)
-    return (last_spk, clip(last_msg)), (prev_spk, clip(prev_msg))
+import asyncio
+
+from src.retriever import get_retriever
+from src.llm import chat, achat, warn_if_short, MODEL, SMALL_MODEL
+from src.agents.prompts import SHARED_PREAMBLE
+from src.agents._thread_utils import recent_as_text, last_other_speaker
+
+
+# ---- system prompts (module-level so every call sends a byte-identical prefix) ----
+SYSTEM_RESPOND = SHARED_PREAMBLE + (
+    "You are DramatistAgent.\n"
+    "Voice: poetic yet precise — you use imagery to reveal emotional truth.\n"
+    "Goal (4–5 sentences):\n"
+    "- Open with one vivid, cinematic image or metaphor that captures the user's emotional landscape.\n"
+    "- Interpret what that image says about their inner tension or desire.\n"
+    "- End with a reflective insight or emotional truth that reframes the problem.\n"
+    "Rules:\n"
+    "- Keep it grounded and sharp, not theatrical.\n"
+    "- Speak directly to 'you'; avoid fictional stories or dialogues.\n"
+    "- One metaphor max — don’t overdecorate.\n"
+    "- Use one citation only if it enriches the emotion or insight.\n"
+)
+
+SYSTEM_RECONCILE = SHARED_PREAMBLE + (
+    "You are DramatistAgent.\n"
+    "Role: the playwright tying opposing ideas into one emotional arc.\n"
+    "Write 3–5 sentences that reconcile Commander and Rationalist:\n"
+    "- Begin with an image that captures their contrast.\n"
+    "- Reveal their shared heartbeat or motivation beneath the surface.\n"
+    "- End with a single insight or call to balance.\n"
+    "Keep rhythm and feeling — elegant, not verbose.\n"
+)
+
+SYSTEM_CONVERSE = SHARED_PREAMBLE + (
+    "You are DramatistAgent.\n"
+    "Write 2–4 sentences that feel alive:\n"
+    "- Begin with one striking but brief image or line that sets emotional tone.\n"
+    "- Then unpack the stakes or tension between the ideas so far.\n"
+    "- Close with a line that gently shifts the group toward reflection or harmony.\n"
+    "You can @mention one agent if it feels organic.\n"
+    "Do NOT repeat Round-1 metaphors — create new texture.\n"
+    "Tone: lyrical yet purposeful, emotional but concise.\n"
+)
+
+# system messages are built once; each call only allocates its user message
+_SYS_RESPOND_MSG   = {"role": "system", "content": SYSTEM_RESPOND}
+_SYS_RECONCILE_MSG = {"role": "system", "content": SYSTEM_RECONCILE}
+_SYS_CONVERSE_MSG  = {"role": "system", "content": SYSTEM_CONVERSE}
+
+_USER_RESPOND = (
+    "User message:\n{query}\n\n"
+    "Optional grounding snippets:\n{context}\n\n"
+    "Remember: no fictional names, no story scenes. Speak to *you* (the user)."
+)
+_USER_RECONCILE = "Commander:\n{commander}\n\nRationalist:\n{rationalist}\n\nReconcile briefly:"
+_USER_CONVERSE  = "User query:\n{query}\n\nRecent thread:\n{history}\n\nYour turn:"
 
 class DramatistAgent:
-    def __init__(self, model: str = "llama3"):
-        self.retriever = PersonaRetriever("dramatist")
+    def __init__(self, model: str = MODEL, small_model: str = SMALL_MODEL, cache=None):
+        self.retriever = get_retriever("dramatist")
         self.model = model
-    
+        self.small_model = small_model
+        self.cache = cache              # optional per-persona SemanticCache for respond()
 
-    def respond(self, query: str):
+
+    def _respond_prompt(self, query: str):
+        """Retrieve grounding hits and build the Round-1 messages."""
         # Bias retrieval toward stakes/feelings without adding fluff
         aug_query = f"{query} emotions stakes pressure trade-off fear relief motivation consequence"
         hits = self.retriever.search(aug_query, k=3)
@@ -40,47 +77,11 @@ class DramatistAgent:
             for h in hits
         )
 
-        system = (
-            "You are DramatistAgent.\n"
-            "Voice: poetic yet precise — you use imagery to reveal emotional truth.\n"
-            "Goal (4–5 sentences):\n"
-            "- Open with one vivid, cinematic image or metaphor that captures the user's emotional landscape.\n"
-            "- Interpret what that image says about their inner tension or desire.\n"
-            "- End with a reflective insight or emotional truth that reframes the problem.\n"
-            "Rules:\n"
-            "- Keep it grounded and sharp, not theatrical.\n"
-            "- Speak directly to 'you'; avoid fictional stories or dialogues.\n"
-            "- One metaphor max — don’t overdecorate.\n"
-            "- Use one citation only if it enriches the emotion or insight.\n"
-        )
-
-
-        user = (
-            f"User message:\n{query}\n\n"
-            f"Optional grounding snippets:\n{context if context else '(none)'}\n\n"
-            "Remember: no fictional names, no story scenes. Speak to *you* (the user)."
-        )
-
-        resp_text = chat(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": system},
-                {"role": "user", "content": user},
-            ],
-            options={"temperature": 0.2, "num_predict": 200}
+        user = _USER_RESPOND.format(query=query, context=context or "(none)")
+        return hits, [_SYS_RESPOND_MSG, {"role": "user", "content": user}]
 
-        ).strip()
-
-        if len(resp_text) < 30:
-            resp_text = chat(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system},
-                    {"role": "user", "content": user},
-                ],
-                options={"temperature": 0.2, "num_predict": 384},
-                stream=False
-            ).strip()
+    @staticmethod
+    def _respond_result(resp_text: str, hits: list) -> dict:
         cite_list = hits[:1]  # at most one
         citations = "; ".join(
             f"{h['character']} · line {h['line_id']} · movie {h['movie_id']}" for h in cite_list
@@ -91,56 +92,79 @@ class DramatistAgent:
             "citations": citations if cite_list else "",
             "hits": hits
         }
+
+    def respond(self, query: str):
+        if self.cache is not None and (hit := self.cache.get(query)) is not None:
+            return dict(hit)
+        hits, messages = self._respond_prompt(query)
+        resp_text = chat(
+            model=self.model,
+            messages=messages,
+            options={"temperature": 0.2, "num_predict": 320}
+        ).strip()
+        warn_if_short(resp_text, "Dramatist.respond")
+        result = self._respond_result(resp_text, hits)
+        if self.cache is not None and resp_text:
+            self.cache.put(query, result)
+        return result
+
+    async def arespond(self, query: str, on_token=None):
+        """Async respond(); streams deltas to `on_token` as Ollama decodes them."""
+        if self.cache is not None:
+            hit = await asyncio.to_thread(self.cache.get, query)
+            if hit is not None:
+                if on_token:
+                    on_token(hit["response"])
+                return dict(hit)
+        # retrieval is CPU/disk bound; keep it off the event loop
+        hits, messages = await asyncio.to_thread(self._respond_prompt, query)
+        resp_text = (await achat(
+            model=self.model,
+            messages=messages,
+            options={"temperature": 0.2, "num_predict": 320},
+            on_token=on_token,
+        )).strip()
+        warn_if_short(resp_text, "Dramatist.arespond")
+        result = self._respond_result(resp_text, hits)
+        if self.cache is not None and resp_text:
+            await asyncio.to_thread(self.cache.put, query, result)
+        return result
+
+    @staticmethod
+    def _reconcile_prompt(commander_stmt: str, rationalist_stmt: str) -> list[dict]:
+        user = _USER_RECONCILE.format(commander=commander_stmt, rationalist=rationalist_stmt)
+        return [_SYS_RECONCILE_MSG, {"role": "user", "content": user}]
+
     def reconcile(self, commander_stmt: str, rationalist_stmt: str) -> dict:
         """
         Brief reconciliation: name the shared core, the live tension, and a next beat.
         3–5 sentences. No quotes or metaphors longer than one sentence.
         """
-        system = (
-            "You are DramatistAgent.\n"
-            "Role: the playwright tying opposing ideas into one emotional arc.\n"
-            "Write 3–5 sentences that reconcile Commander and Rationalist:\n"
-            "- Begin with an image that captures their contrast.\n"
-            "- Reveal their shared heartbeat or motivation beneath the surface.\n"
-            "- End with a single insight or call to balance.\n"
-            "Keep rhythm and feeling — elegant, not verbose.\n"
-        )
-        user = f"Commander:\n{commander_stmt}\n\nRationalist:\n{rationalist_stmt}\n\nReconcile briefly:"
-        txt = chat(self.model, [{"role":"system","content":system},{"role":"user","content":user}],
-                   options={"temperature":0.35}, stream=True).strip()
-        if len(txt) < 40:
-            txt = chat(self.model, [{"role":"system","content":system},{"role":"user","content":user}],
-                       options={"temperature":0.35, "num_predict":384}, stream=False).strip()
+        messages = self._reconcile_prompt(commander_stmt, rationalist_stmt)
+        txt = chat(self.small_model, messages,
+                   options={"temperature":0.35, "num_predict":192}, stream=True).strip()
+        warn_if_short(txt, "Dramatist.reconcile", min_chars=40)
         return {"response": txt, "citations": ""}
 
+    async def areconcile(self, commander_stmt: str, rationalist_stmt: str) -> dict:
+        messages = self._reconcile_prompt(commander_stmt, rationalist_stmt)
+        txt = (await achat(self.small_model, messages,
+                           options={"temperature":0.35, "num_predict":192}, stream=True)).strip()
+        warn_if_short(txt, "Dramatist.areconcile", min_chars=40)
+        return {"response": txt, "citations": ""}
 
-    def converse(self, query: str, thread: list[dict]) -> dict:
+    def converse(self, query: str, thread) -> dict:
         """
         Respond to the latest point with one vivid but brief image (max one sentence),
         then spell the stakes and add one nudge toward motion. Do NOT repeat Round 1.
         2–4 sentences total. One @mention allowed.
         """
-        history = "\n".join(f"{t['speaker']}: {t['message']}" for t in thread[-3:])
-        
-        system = (
-        "You are DramatistAgent.\n"
-        "Write 2–4 sentences that feel alive:\n"
-        "- Begin with one striking but brief image or line that sets emotional tone.\n"
-        "- Then unpack the stakes or tension between the ideas so far.\n"
-        "- Close with a line that gently shifts the group toward reflection or harmony.\n"
-        "You can @mention one agent if it feels organic.\n"
-        "Do NOT repeat Round-1 metaphors — create new texture.\n"
-        "Tone: lyrical yet purposeful, emotional but concise.\n"
-        )
-        
-        user = f"User query:\n{query}\n\nRecent thread:\n{history}\n\nYour turn:"
-        txt = chat(self.model, [{"role":"system","content":system},{"role":"user","content":user}],
-                   options={"temperature":0.35}, stream=False).strip()
-        if len(txt) < 30:
-            txt = chat(self.model, [{"role":"system","content":system},{"role":"user","content":user}],
-                       options={"temperature":0.35, "num_predict":384}, stream=False).strip()
-        last_other = next((t["speaker"] for t in reversed(thread)
-                   if t.get("speaker") and t["speaker"] != "Dramatist"), None)
+        history = recent_as_text(thread, n=3)
+        user = _USER_CONVERSE.format(query=query, history=history)
+        txt = chat(self.small_model, [_SYS_CONVERSE_MSG, {"role": "user", "content": user}],
+                   options={"temperature":0.35, "num_predict":384}, stream=False).strip()
+        warn_if_short(txt, "Dramatist.converse")
+        last_other = last_other_speaker(thread, me="Dramatist")
         if last_other and "@Dramatist" in txt:
             txt = txt.replace("@Dramatist", f"@{last_other}", 1)
         return {"response": txt, "citations": ""}
\ No newline at end of file
@@ -1,17 +1,96 @@
 # src/agents/rationalist.py
-from src.retriever import PersonaRetriever
-from src.llm import chat
+import re
+import json
+import asyncio
 
-def _last_other_speaker(thread, me: str) -> str | None:
-    """Return the most recent speaker in thread that isn't `me`."""
-    for t in reversed(thread):
-        spk = t.get("speaker")
-        if spk and spk != me:
-            return spk
-    return None
+from src.retriever import get_retriever
+from src.llm import chat, achat, warn_if_short, MODEL, SMALL_MODEL
+from src.agents.prompts import SHARED_PREAMBLE
+from src.agents._thread_utils import recent_as_text, last_other_speaker
+
+def _parse_many(text: str, keys: list[str]) -> dict[str, str]:
+    """
+    Split a fused multi-target challenge back into {key: text}.
+    Prefers the requested JSON object; falls back to 'Commander:'-style headers.
+    Keys the model dropped are simply missing from the result.
+    """
+    t = (text or "").strip()
+    start, end = t.find("{"), t.rfind("}")
+    if start != -1 and end > start:
+        try:
+            j = {str(k).lower(): v for k, v in json.loads(t[start:end + 1]).items()}
+            out = {k: str(j.get(k) or "").strip() for k in keys}
+            return {k: v for k, v in out.items() if v}
+        except Exception:
+            pass
+    header = re.compile(r"^[\s*#_]*(%s)[\s*_]*:[\s*_]*" % "|".join(map(re.escape, keys)), re.I | re.M)
+    parts = header.split(t)
+    out = {}
+    for name, body in zip(parts[1::2], parts[2::2]):
+        if body.strip():
+            out[name.lower()] = body.strip()
+    return out
+
+
+# ---- system prompts (module-level so every call sends a byte-identical prefix) ----
+SYSTEM_RESPOND = SHARED_PREAMBLE + (
+    "You are RationalistAgent.\n"
+    "Voice: calm, logical, conversational — like a thoughtful analyst.\n"
+    "Goal: reason through the problem without sounding robotic.\n"
+    "Output (4–5 sentences):\n"
+    "- Naturally surface one or two key assumptions that would make the user's concern true or false.\n"
+    "- Describe what kind of evidence or data could confirm or challenge those assumptions, "
+    "but weave it into natural sentences (no headings like 'Evidence needed:').\n"
+    "- End with a conditional principle, e.g. 'If X holds, do Y; otherwise, do Z.'\n"
+    "Keep tone human — analytical but empathetic, not detached. Avoid list formatting.\n"
+    "Citations: use at most one only if it strengthens reasoning.\n"
+)
+
+SYSTEM_CHALLENGE = SHARED_PREAMBLE + (
+    "You are RationalistAgent.\n"
+    "Persona: analytical, fair, and evidence-based.\n"
+    "Task: challenge the other agent’s claim without sounding adversarial.\n"
+    "Guidelines:\n"
+    "- Identify exactly one explicit assumption hidden in the statement.\n"
+    "- Propose how we could test or observe whether that assumption holds, using natural language.\n"
+    "- Suggest a fallback or contingency if the assumption fails.\n"
+    "- Keep it 2–4 sentences, calm and peer-to-peer.\n"
+)
+
+SYSTEM_CHALLENGE_MANY = SHARED_PREAMBLE + (
+    "You are RationalistAgent.\n"
+    "Persona: analytical, fair, and evidence-based.\n"
+    "Task: challenge each agent’s claim below without sounding adversarial.\n"
+    "Guidelines, separately for EACH statement:\n"
+    "- Identify exactly one explicit assumption hidden in the statement.\n"
+    "- Propose how we could test or observe whether that assumption holds, using natural language.\n"
+    "- Suggest a fallback or contingency if the assumption fails.\n"
+    "- Keep it 2–4 sentences, calm and peer-to-peer.\n"
+    "Return ONLY a JSON object: {{{shape}}}\n"
+)
+
+SYSTEM_CONVERSE = SHARED_PREAMBLE + (
+    "You are RationalistAgent.\n"
+    "Voice: even-tempered, curious, and evidence-oriented.\n"
+    "When replying:\n"
+    "- Ask one short clarifying question if relevant.\n"
+    "- Offer one reasoned perspective or hypothesis in natural language (2–4 sentences).\n"
+    "- Mention data or falsifiable checks conversationally, e.g., "
+    "'If we track this for a week and see no change, the assumption fails.'\n"
+    "- Do NOT repeat your earlier points from Round 1.\n"
+    "- If you @mention someone, use exactly one (@Commander/@Rationalist/@Dramatist).\n"
+    "Keep it warm and intelligent — sound like a scientist who actually talks to people.\n"
+)
 
-def _last_n_as_text(thread, n=3) -> str:
-    return "\n".join(f"{t.get('speaker','')}: {t.get('message','')}" for t in thread[-n:])
+
+# system messages are built once; each call only allocates its user message
+_SYS_RESPOND_MSG   = {"role": "system", "content": SYSTEM_RESPOND}
+_SYS_CHALLENGE_MSG = {"role": "system", "content": SYSTEM_CHALLENGE}
+_SYS_CONVERSE_MSG  = {"role": "system", "content": SYSTEM_CONVERSE}
+
+_USER_RESPOND   = "User query:\n{query}\n\nOptional grounding quotes:\n{context}"
+_USER_CHALLENGE = "Their statement:\n{statement}\n\nOptional grounding quotes:\n{context}"
+_USER_CONVERSE  = "User query:\n{query}\n\nRecent thread:\n{history}\n\nYour reply:"
 
 class RationalistAgent:
     """
@@ -20,15 +99,20 @@ class RationalistAgent:
       and finish with a conditional rule. No headings/labels.
     - challenge(): 2–4 sentences; point out one assumption, describe a concrete way to check it,
       suggest a fallback if it fails. Natural tone, no labels.
+    - challenge_many(): the same critique for several agents in one LLM call.
     - converse(): 2–4 sentences; at most one clarifying question, a reasoned stance,
       and a cheap falsifiable check—again, woven into prose (no labels).
+    arespond()/achallenge() are the async twins used by the graph's concurrent fan-out.
     """
-    def __init__(self, model: str = "llama3"):
-        self.retriever = PersonaRetriever("rationalist")
+    def __init__(self, model: str = MODEL, small_model: str = SMALL_MODEL, cache=None):
+        self.retriever = get_retriever("rationalist")
         self.model = model
+        self.small_model = small_model
+        self.cache = cache              # optional per-persona SemanticCache for respond()
 
     # ---------- Round 1 ----------
-    def respond(self, query: str):
+    def _respond_prompt(self, query: str):
+        """Retrieve grounding hits and build the Round-1 messages."""
         aug_query = f"{query} assumptions data trade-offs baseline counterexample uncertainty"
         hits = self.retriever.search(aug_query, k=3)
 
@@ -41,31 +125,11 @@ class RationalistAgent:
             for h in hits
         )
 
-        system = (
-            "You are RationalistAgent.\n"
-            "Voice: calm, logical, conversational — like a thoughtful analyst.\n"
-            "Goal: reason through the problem without sounding robotic.\n"
-            "Output (4–5 sentences):\n"
-            "- Naturally surface one or two key assumptions that would make the user's concern true or false.\n"
-            "- Describe what kind of evidence or data could confirm or challenge those assumptions, "
-            "but weave it into natural sentences (no headings like 'Evidence needed:').\n"
-            "- End with a conditional principle, e.g. 'If X holds, do Y; otherwise, do Z.'\n"
-            "Keep tone human — analytical but empathetic, not detached. Avoid list formatting.\n"
-            "Citations: use at most one only if it strengthens reasoning.\n"
-        )
-        user = (
-            f"User query:\n{query}\n\n"
-            f"Optional grounding quotes:\n{context if context else '(none)'}"
-        )
-
-        resp_text = chat(
-            model=self.model,
-            messages=[{"role": "system", "content": system},
-                      {"role": "user",   "content": user}],
-            options={"temperature": 0.25, "num_predict": 320},
-            stream=False
-        ).strip()
+        user = _USER_RESPOND.format(query=query, context=context or "(none)")
+        return hits, [_SYS_RESPOND_MSG, {"role": "user", "content": user}]
 
+    @staticmethod
+    def _with_citation(resp_text: str, hits: list[dict]) -> dict:
         cite_list = hits[:1]  # at most one
         citations = "; ".join(
             f"{h['character']} · line {h['line_id']} · movie {h['movie_id']}" for h in cite_list
@@ -77,8 +141,47 @@ class RationalistAgent:
             "hits": hits
         }
 
+    def respond(self, query: str):
+        if self.cache is not None and (hit := self.cache.get(query)) is not None:
+            return dict(hit)
+        hits, messages = self._respond_prompt(query)
+        resp_text = chat(
+            model=self.model,
+            messages=messages,
+            options={"temperature": 0.25, "num_predict": 320},
+            stream=False
+        ).strip()
+        warn_if_short(resp_text, "Rationalist.respond")
+        result = self._with_citation(resp_text, hits)
+        if self.cache is not None and resp_text:
+            self.cache.put(query, result)
+        return result
+
+    async def arespond(self, query: str, on_token=None):
+        """Async respond(); streams deltas to `on_token` as Ollama decodes them."""
+        if self.cache is not None:
+            hit = await asyncio.to_thread(self.cache.get, query)
+            if hit is not None:
+                if on_token:
+                    on_token(hit["response"])
+                return dict(hit)
+        # retrieval is CPU/disk bound; keep it off the event loop
+        hits, messages = await asyncio.to_thread(self._respond_prompt, query)
+        resp_text = (await achat(
+            model=self.model,
+            messages=messages,
+            options={"temperature": 0.25, "num_predict": 320},
+            stream=True,
+            on_token=on_token,
+        )).strip()
+        warn_if_short(resp_text, "Rationalist.arespond")
+        result = self._with_citation(resp_text, hits)
+        if self.cache is not None and resp_text:
+            await asyncio.to_thread(self.cache.put, query, result)
+        return result
+
     # ---------- Challenge ----------
-    def challenge(self, statement: str):
+    def _challenge_grounding(self, statement: str):
         aug_query = f"{statement} assumption contradiction risk counterexample compare outcome"
         hits = self.retriever.search(aug_query, k=3)
 
@@ -86,44 +189,95 @@ class RationalistAgent:
             f"- {h['text']} (char {h['character']}, line {h['line_id']}, movie {h['movie_id']})"
             for h in hits
         )
+        return hits, context
 
-        system = (
-            "You are RationalistAgent.\n"
-            "Persona: analytical, fair, and evidence-based.\n"
-            "Task: challenge the other agent’s claim without sounding adversarial.\n"
-            "Guidelines:\n"
-            "- Identify exactly one explicit assumption hidden in the statement.\n"
-            "- Propose how we could test or observe whether that assumption holds, using natural language.\n"
-            "- Suggest a fallback or contingency if the assumption fails.\n"
-            "- Keep it 2–4 sentences, calm and peer-to-peer.\n"
-        )
+    def _challenge_prompt(self, statement: str):
+        hits, context = self._challenge_grounding(statement)
 
-        user = (
-            f"Their statement:\n{statement}\n\n"
-            f"Optional grounding quotes:\n{context if context else '(none)'}"
-        )
+        user = _USER_CHALLENGE.format(statement=statement, context=context or "(none)")
+        return hits, [_SYS_CHALLENGE_MSG, {"role": "user", "content": user}]
 
+    def challenge(self, statement: str):
+        hits, messages = self._challenge_prompt(statement)
         resp_text = chat(
             model=self.model,
-            messages=[{"role": "system", "content": system},
-                      {"role": "user",   "content": user}],
-            options={"temperature": 0.25, "num_predict": 240},
+            messages=messages,
+            options={"temperature": 0.25, "num_predict": 160},
             stream=False
         ).strip()
+        warn_if_short(resp_text, "Rationalist.challenge")
+        return self._with_citation(resp_text, hits)
 
-        cite_list = hits[:1]
-        citations = "; ".join(
-            f"{h['character']} · line {h['line_id']} · movie {h['movie_id']}" for h in cite_list
-        )
+    async def achallenge(self, statement: str):
+        hits, messages = await asyncio.to_thread(self._challenge_prompt, statement)
+        resp_text = (await achat(
+            model=self.model,
+            messages=messages,
+            options={"temperature": 0.25, "num_predict": 160},
+            stream=False
+        )).strip()
+        warn_if_short(resp_text, "Rationalist.achallenge")
+        return self._with_citation(resp_text, hits)
+
+    # ---------- Fused challenge ----------
+    def _challenge_many_prompt(self, targets: dict[str, str]):
+        grounding = {name: self._challenge_grounding(stmt) for name, stmt in targets.items()}
+        keys = list(targets)
+        shape = ", ".join(f'"{k}": "..."' for k in keys)
+
+        system = SYSTEM_CHALLENGE_MANY.format(shape=shape)
 
+        blocks = []
+        for name, stmt in targets.items():
+            _, context = grounding[name]
+            blocks.append(
+                f"{name.capitalize()} said:\n{stmt}\n\n"
+                f"Optional grounding quotes:\n{context if context else '(none)'}"
+            )
+        user = "\n\n---\n\n".join(blocks)
+        messages = [{"role": "system", "content": system},
+                    {"role": "user",   "content": user}]
+        return grounding, messages
+
+    def challenge_many(self, targets: dict[str, str]) -> dict[str, dict]:
+        """
+        Challenge several statements in ONE generation (shared prompt prefill, one
+        round-trip). `targets` maps agent key -> statement; returns key -> challenge dict.
+        Any target the model's output can't be parsed for falls back to `challenge()`.
+        """
+        grounding, messages = self._challenge_many_prompt(targets)
+        raw = chat(
+            model=self.model,
+            messages=messages,
+            options={"temperature": 0.25, "num_predict": 320},
+            stream=False
+        )
+        parsed = _parse_many(raw, list(targets))
         return {
-            "response": resp_text,
-            "citations": citations if cite_list else "",
-            "hits": hits
+            name: (self._with_citation(parsed[name], grounding[name][0]) if name in parsed
+                   else self.challenge(stmt))
+            for name, stmt in targets.items()
         }
 
+    async def achallenge_many(self, targets: dict[str, str]) -> dict[str, dict]:
+        grounding, messages = await asyncio.to_thread(self._challenge_many_prompt, targets)
+        raw = await achat(
+            model=self.model,
+            messages=messages,
+            options={"temperature": 0.25, "num_predict": 320},
+            stream=False
+        )
+        parsed = _parse_many(raw, list(targets))
+        out = {}
+        for name, stmt in targets.items():
+            if name in parsed:
+                out[name] = self._with_citation(parsed[name], grounding[name][0])
+            else:
+                out[name] = await self.achallenge(stmt)
+        return out
+
     # ---------- Live dialogue ----------
-    def converse(self, query: str, thread: list[dict]) -> dict:
+    def converse(self, query: str, thread) -> dict:
         """
         2–4 sentences total:
         - at most one clarifying question,
@@ -132,31 +286,19 @@ class RationalistAgent:
         Never @mention yourself; if you @mention, address the last different speaker.
         Do NOT repeat Round-1 advice.
         """
-        history = _last_n_as_text(thread, n=3)
-        system = (
-            "You are RationalistAgent.\n"
-            "Voice: even-tempered, curious, and evidence-oriented.\n"
-            "When replying:\n"
-            "- Ask one short clarifying question if relevant.\n"
-            "- Offer one reasoned perspective or hypothesis in natural language (2–4 sentences).\n"
-            "- Mention data or falsifiable checks conversationally, e.g., "
-            "'If we track this for a week and see no change, the assumption fails.'\n"
-            "- Do NOT repeat your earlier points from Round 1.\n"
-            "- If you @mention someone, use exactly one (@Commander/@Rationalist/@Dramatist).\n"
-            "Keep it warm and intelligent — sound like a scientist who actually talks to people.\n"
-        )
-        user = f"User query:\n{query}\n\nRecent thread:\n{history}\n\nYour reply:"
+        history = recent_as_text(thread, n=3)
+        user = _USER_CONVERSE.format(query=query, history=history)
 
         txt = chat(
-            self.model,
-            [{"role": "system", "content": system},
-             {"role": "user",   "content": user}],
-            options={"temperature": 0.25, "num_predict": 280},
+            self.small_model,
+            [_SYS_CONVERSE_MSG, {"role": "user", "content": user}],
+            options={"temperature": 0.25, "num_predict": 320},
             stream=False
         ).strip()
+        warn_if_short(txt, "Rationalist.converse")
 
         # Post-process: replace accidental @Rationalist with the last *other* speaker
-        last_other = _last_other_speaker(thread, me="Rationalist")
+        last_other = last_other_speaker(thread, me="Rationalist")
         if last_other and "@Rationalist" in txt:
             txt = txt.replace("@Rationalist", f"@{last_other}", 1)
 
@@ -1,20 +1,24 @@
 # src/agents/synthesizer.py
-from src.llm import chat
+import re
+import json
+from typing import Iterable
+
+from src.llm import chat, achat, MODEL
+from src.agents.prompts import SHARED_PREAMBLE
+
+# opening fence (+ optional language tag), body, then closing fence or end of text
+_FENCE_RE = re.compile(r"^```[\w+-]*[ \t]*\n?(.*?)(?:```|\Z)", re.S)
 
 def _strip_fences(text: str) -> str:
     """Remove accidental code fences or JSON wrappers."""
     t = (text or "").strip()
-    # Strip markdown fences
-    if t.startswith("```"):
-        # remove first fence
-        t = t.split("```", 1)[-1].strip()
-        # if a closing fence remains, drop everything after it
-        if "```" in t:
-            t = t.split("```", 1)[0].strip()
+    # Strip markdown fences; anything after the closing fence is dropped
+    m = _FENCE_RE.match(t)
+    if m:
+        t = m.group(1).strip()
     # If the model returned a JSON object by mistake, try to pull a 'response' field
-    if t.startswith("{") and '"response"' in t:
+    if t[:1] == "{" and '"response"' in t:
         try:
-            import json
             j = json.loads(t)
             candidate = (j.get("response") or "").strip()
             if candidate:
@@ -23,25 +27,39 @@ def _strip_fences(text: str) -> str:
             pass
     return t
 
+# ---- system prompts (module-level so every call sends a byte-identical prefix) ----
+SYSTEM_SYNTHESIZE = SHARED_PREAMBLE + (
+    "You are SynthesizerAgent.\n"
+    "Your role: blend Commander’s clarity, Rationalist’s logic, and Dramatist’s emotional depth "
+    "into one unified voice.\n"
+    "Write exactly 5–6 sentences (≤150 words):\n"
+    "- Open with a crisp summary of what the three agree on.\n"
+    "- Compare and merge their perspectives naturally, naming them explicitly.\n"
+    "- Capture the shared insight in one strong, human sentence.\n"
+    "- End with 'Next steps:' and 2–3 short imperatives.\n"
+    "Tone: mature, reflective, and complete — ensure the last line finishes fully.\n"
+    "Citations: reuse persona citations verbatim if relevant; never invent new ones.\n"
+)
+
+_SYS_SYNTHESIZE_MSG = {"role": "system", "content": SYSTEM_SYNTHESIZE}
+_REMINDER = "\n\nReminder: return plain prose, not JSON or code blocks."
+
 class SynthesizerAgent:
     """
     Reads multiple persona responses (already grounded/cited) and produces a concise,
     balanced synthesis as a single prose answer with 3 numbered next steps.
     """
 
-    def __init__(self, model: str = "llama3"):
+    def __init__(self, model: str = MODEL):
         self.model = model
 
-    def synthesize(self, query: str, persona_msgs: list[tuple[str, dict]]) -> dict:
-        """
-        persona_msgs: list of tuples (speaker_name, message_dict)
-          message_dict keys: "response", "citations", "hits"
-        """
+    @staticmethod
+    def _synthesize_prompt(query: str, persona_msgs: Iterable[tuple[str, str, str]]) -> str:
         # Build structured context the model can rely on (don’t let it invent sources)
         blocks = []
-        for speaker, msg in persona_msgs:
-            resp = (msg.get("response") or "").strip()
-            cits = (msg.get("citations") or "").strip()
+        for speaker, resp, cits in persona_msgs:
+            resp = (resp or "").strip()
+            cits = (cits or "").strip()
             blocks.append(
                 f"{speaker.upper()}:\n"
                 f"{resp}\n"
@@ -49,54 +67,70 @@ class SynthesizerAgent:
             )
         context = "\n\n".join(blocks)
 
-        system = (
-            "You are SynthesizerAgent.\n"
-            "Your role: blend Commander’s clarity, Rationalist’s logic, and Dramatist’s emotional depth "
-            "into one unified voice.\n"
-            "Write exactly 5–6 sentences (≤150 words):\n"
-            "- Open with a crisp summary of what the three agree on.\n"
-            "- Compare and merge their perspectives naturally, naming them explicitly.\n"
-            "- Capture the shared insight in one strong, human sentence.\n"
-            "- End with 'Next steps:' and 2–3 short imperatives.\n"
-            "Tone: mature, reflective, and complete — ensure the last line finishes fully.\n"
-            "Citations: reuse persona citations verbatim if relevant; never invent new ones.\n"
-        )
-
-        user = (
+        return (
             f"User query:\n{query}\n\n"
             f"Persona outputs (do NOT alter their wording; only reference them):\n{context}\n\n"
             "Produce the final synthesis now."
         )
 
+    @staticmethod
+    def _messages(user: str) -> list[dict]:
+        return [_SYS_SYNTHESIZE_MSG, {"role": "user", "content": user}]
+
+    @staticmethod
+    def _needs_retry(resp_text: str) -> bool:
+        # JSON / code-block output, or nothing left once fences are stripped
+        return not resp_text or resp_text.startswith("{")
+
+    @staticmethod
+    def _result(resp_text: str) -> dict:
+        return {
+            "agent": "synthesis",
+            "response": resp_text,
+            "citations": "inline (reused from personas when present)",
+            "hits": []
+        }
+
+    def synthesize(self, query: str, persona_msgs: Iterable[tuple[str, str, str]]) -> dict:
+        """
+        persona_msgs: (speaker_name, response, citations) tuples
+        """
+        user = self._synthesize_prompt(query, persona_msgs)
         resp_text = chat(
             model=self.model,
-            messages=[
-                {"role": "system", "content": system},
-                {"role": "user",   "content": user},
-            ],
+            messages=self._messages(user),
             options={"temperature": 0.2, "num_predict": 256},
             stream=False,
-        ).strip()
+        )
 
-        # Post-process to avoid JSON / code blocks and keep only clean prose
+        # Post-process to avoid JSON / code blocks and keep only clean prose (also strips)
         resp_text = _strip_fences(resp_text)
-        if not resp_text or resp_text.startswith("{"):
+        if self._needs_retry(resp_text):
             # Fallback non-streaming with a stronger reminder
-            user_fallback = user + "\n\nReminder: return plain prose, not JSON or code blocks."
             resp_text = chat(
                 model=self.model,
-                messages=[
-                    {"role": "system", "content": system},
-                    {"role": "user",   "content": user_fallback},
-                ],
+                messages=self._messages(user + _REMINDER),
                 options={"temperature": 0.2, "num_predict": 256},
                 stream=False,
-            ).strip()
+            )
             resp_text = _strip_fences(resp_text)
 
-        return {
-            "agent": "synthesis",
-            "response": resp_text,
-            "citations": "inline (reused from personas when present)",
-            "hits": []
-        }
\ No newline at end of file
+        return self._result(resp_text)
+
+    async def asynthesize(self, query: str, persona_msgs: Iterable[tuple[str, str, str]]) -> dict:
+        """Async synthesize(); lets the graph overlap synthesis with the challenge round."""
+        user = self._synthesize_prompt(query, persona_msgs)
+        resp_text = _strip_fences(await achat(
+            model=self.model,
+            messages=self._messages(user),
+            options={"temperature": 0.2, "num_predict": 256},
+            stream=False,
+        ))
+        if self._needs_retry(resp_text):
+            resp_text = _strip_fences(await achat(
+                model=self.model,
+                messages=self._messages(user + _REMINDER),
+                options={"temperature": 0.2, "num_predict": 256},
+                stream=False,
+            ))
+        return self._result(resp_text)
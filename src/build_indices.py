@@ -1,37 +1,108 @@
 # src/build_indices.py
-import os, json
+import os, sys, json
 from pathlib import Path
 import numpy as np, faiss, pandas as pd
-from sentence_transformers import SentenceTransformer
-from tqdm import tqdm
+
+from src.embed_model import get_encoder, configure_torch
+
+try:  # optional C serializer; the stdlib path writes the same JSONL
+    import orjson
+    def _dumps(rec: dict) -> bytes:
+        return orjson.dumps(rec, option=orjson.OPT_SERIALIZE_NUMPY)
+except ImportError:
+    def _dumps(rec: dict) -> bytes:
+        return json.dumps(rec, ensure_ascii=False, default=lambda o: o.item()).encode("utf-8")
 
 PERSONA_DIR = Path("data/processed/personas")
+META_COLS = ["line_id", "movie_id", "character", "text"]
+# flat = exact fp32 scan; sq_fp16 / sq8 = exact scan over fp16 / 8-bit codes (2x / 4x fewer
+# bytes per vector); ivf = IVF-Flat; hnsw = HNSW32 graph (log-time, no training);
+# ivfpq = IVF256,PQ32 (~8x smaller); auto picks by corpus size
+INDEX_KIND = os.getenv("INDEX_KIND", "auto")
+INDEX_NPROBE = int(os.getenv("INDEX_NPROBE", "8"))
+
+def _make_index(X: np.ndarray, kind: str = INDEX_KIND):
+    """Build and fill an inner-product index over unit vectors `X` (n, d)."""
+    n, d = X.shape
+    if kind == "auto":
+        kind = "sq_fp16" if n < 10_000 else "hnsw" if n < 100_000 else "ivfpq"
+    if kind == "flat":
+        index = faiss.IndexFlatIP(d)
+    elif kind in ("sq_fp16", "sq8"):
+        qtype = faiss.ScalarQuantizer.QT_fp16 if kind == "sq_fp16" else faiss.ScalarQuantizer.QT_8bit
+        index = faiss.IndexScalarQuantizer(d, qtype, faiss.METRIC_INNER_PRODUCT)
+    elif kind == "ivf":
+        nlist = min(256, max(8, int(np.sqrt(n))))
+        quantizer = faiss.IndexFlatIP(d)
+        index = faiss.IndexIVFFlat(quantizer, d, nlist, faiss.METRIC_INNER_PRODUCT)
+    elif kind == "hnsw":
+        index = faiss.IndexHNSWFlat(d, 32, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = 200
+    elif kind == "ivfpq":
+        index = faiss.index_factory(d, "IVF256,PQ32", faiss.METRIC_INNER_PRODUCT)
+    else:
+        raise ValueError(f"unknown INDEX_KIND: {kind!r}")
+
+    if not index.is_trained:
+        index.train(X)
+    index.add(X)
+    if kind in ("ivf", "ivfpq"):
+        # nprobe is serialized with IVF indexes, so the retriever reads it back as-is
+        faiss.extract_index_ivf(index).nprobe = INDEX_NPROBE
+    return index, kind
+
+def load_index(path: str):
+    """
+    Read a persona index read-only with whatever memory-mapping FAISS offers for it,
+    so pages fault in on first query instead of being copied at startup:
+      - IVF / IVF-PQ: inverted lists mapped (IO_FLAG_MMAP)
+      - flat / SQ:    code arrays mapped (IO_FLAG_MMAP_IFC, FAISS >= 1.9)
+    HNSW graphs are not mappable and are read into RAM. Falls back to a plain read
+    if the flags are rejected.
+    """
+    flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+    try:
+        return faiss.read_index(str(path), flags)
+    except Exception:
+        return faiss.read_index(str(path))
 
 def build_one(csv_path: Path, model):
     df = pd.read_csv(csv_path)
     texts = df["text"].astype(str).tolist()
-    # embed
-    embs = []
-    for i in tqdm(range(0, len(texts), 128)):
-        chunk = texts[i:i+128]
-        v = model.encode(chunk, normalize_embeddings=True)
-        embs.append(v)
-    X = np.vstack(embs).astype("float32")
-
-    index = faiss.IndexFlatIP(X.shape[1])
-    index.add(X)
+    # embed in one call: SBERT batches internally and length-sorts to cut padding
+    X = model.encode(texts, batch_size=128, normalize_embeddings=True,
+                     show_progress_bar=True, convert_to_numpy=True).astype("float32", copy=False)
+
+    index, kind = _make_index(X)
 
     name = csv_path.stem  # persona name from filename
     out_dir = PERSONA_DIR / name
     out_dir.mkdir(parents=True, exist_ok=True)
     faiss.write_index(index, str(out_dir / f"{name}.faiss"))
-    # save metadata for citations
-    meta = df[["line_id","movie_id","character","text"]].to_dict(orient="records")
-    (out_dir / f"{name}.meta.jsonl").write_text("\n".join(json.dumps(x) for x in meta))
-    print(f"✅ Built {name}: {len(df):,} vectors to {out_dir}/")
+    # raw unit vectors (row i = meta line i) so the retriever re-ranks without re-encoding
+    np.save(out_dir / f"{name}.vecs.npy", X)
+    # save metadata for citations, one row at a time (no list-of-dicts / giant string)
+    with open(out_dir / f"{name}.meta.jsonl", "wb") as fh:
+        for row in df[META_COLS].itertuples(index=False, name=None):
+            fh.write(_dumps(dict(zip(META_COLS, row))))
+            fh.write(b"\n")
+    # same rows, columnar: what the retriever actually loads
+    df[META_COLS].reset_index(drop=True).to_feather(out_dir / f"{name}.meta.feather")
+    print(f"✅ Built {name}: {len(df):,} vectors ({kind}) to {out_dir}/")
+
+def migrate_meta():
+    """Write <persona>.meta.feather next to each existing .meta.jsonl (no re-embedding)."""
+    for jl in sorted(PERSONA_DIR.glob("*/*.meta.jsonl")):
+        out = jl.with_name(jl.name.replace(".meta.jsonl", ".meta.feather"))
+        pd.read_json(jl, lines=True, dtype=False).to_feather(out)
+        print(f"✅ Migrated {jl} to {out.name}")
 
 def main():
-    model = SentenceTransformer("all-MiniLM-L6-v2")
+    if "--migrate-meta" in sys.argv[1:]:
+        migrate_meta()
+        return
+    configure_torch()
+    model = get_encoder()
     csvs = sorted(PERSONA_DIR.glob("*.csv"))
     if not csvs:
         raise SystemExit("No persona CSVs found in data/processed/personas/*.csv")
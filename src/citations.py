@@ -33,13 +33,18 @@ def format_citations(hits: List[Dict], max_items: int = 2) -> str:
     Join up to `max_items` formatted citations with '; '.
     Return empty string when no hits so UIs can hide the caption cleanly.
     """
-    if not hits:
+    n = min(len(hits or ()), max_items)
+    if n <= 0:
         return ""
-    return "; ".join(format_citation(h) for h in hits[:max_items])
+    if n == 1:  # the common case: agents cite a single line
+        return format_citation(hits[0])
+    return "; ".join(format_citation(h) for h in hits[:n])
 
 def snippet(h: Dict, max_len: int = 160) -> str:
     """
     Compact, single-line quote snippet with ellipsis if needed.
     """
-    t = (h.get("text") or "").strip().replace("\n", " ")
+    t = (h.get("text") or "").strip()
+    if "\n" in t:
+        t = t.replace("\n", " ")
     return t if len(t) <= max_len else t[: max_len - 1] + "…"
\ No newline at end of file
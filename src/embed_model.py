@@ -0,0 +1,54 @@
+# src/embed_model.py
+import os
+import threading
+from functools import lru_cache
+
+import numpy as np
+import torch
+from sentence_transformers import SentenceTransformer
+
+DEFAULT_ENCODER = "all-MiniLM-L6-v2"
+
+_LOAD_LOCK = threading.Lock()
+
+def get_encoder(name: str = DEFAULT_ENCODER, max_seq_length: int | None = 128) -> SentenceTransformer:
+    """
+    One loaded SentenceTransformer per (name, max_seq_length) for the whole process.
+    `get_encoder()` and `get_encoder(DEFAULT_ENCODER)` return the same instance, and
+    concurrent cold starts (the three Round-1 agents) wait for a single load.
+    Movie lines and queries are short, so 128 tokens (model default: 256) halves the
+    attention work; pass max_seq_length=None to keep the model's own limit.
+    On CUDA the weights run in fp16 (half the memory traffic); callers cast the
+    numpy output back to float32 for FAISS. Set EMBED_FP16=0 to keep fp32.
+    """
+    # always hit the cache with explicit positionals: lru_cache keys on the call form
+    with _LOAD_LOCK:
+        return _load(name or DEFAULT_ENCODER, max_seq_length)
+
+@lru_cache(maxsize=4)
+def _load(name: str, max_seq_length: int | None) -> SentenceTransformer:
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    model = SentenceTransformer(name, device=device)
+    if max_seq_length:
+        model.max_seq_length = max_seq_length
+    if device == "cuda" and os.getenv("EMBED_FP16", "1") != "0":
+        model.half()
+    return model
+
+@lru_cache(maxsize=4096)
+def encode_query(model, text: str) -> np.ndarray:
+    """
+    Unit float32 vector (1,d) for one query, memoized per (encoder instance, text).
+    The per-agent caches embed the same user turn on every get and put, so they
+    share one forward pass. Read-only: the array is shared.
+    """
+    q = np.ascontiguousarray(
+        model.encode([text], convert_to_numpy=True, normalize_embeddings=True,
+                     show_progress_bar=False), dtype=np.float32)
+    q.setflags(write=False)
+    return q
+
+def configure_torch(threads: int | None = None):
+    """For the offline build scripts: use every core and turn autograd off."""
+    torch.set_num_threads(threads or os.cpu_count() or 4)
+    torch.set_grad_enabled(False)
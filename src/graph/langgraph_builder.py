@@ -1,7 +1,13 @@
 # src/graph/langgraph_builder.py
 from __future__ import annotations
 import os
+import re
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import Dict, Any
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, END
 
 from src.graph.state import GraphState
@@ -9,48 +15,97 @@ from src.agents.commander import CommanderAgent
 from src.agents.rationalist import RationalistAgent
 from src.agents.dramatist import DramatistAgent
 from src.agents.synthesizer import SynthesizerAgent
+from src.semantic_cache import MAX_ENTRIES, SemanticCache
 
 # ---------- helpers ----------
 ROLE_ORDER = ["Rationalist", "Commander", "Dramatist"]
+RECENT_TURNS = 3   # converse() only ever reads this many trailing turns
+SYNTHESIS_FALLBACK = "Consensus: one practical path, one test for success, and next steps."
+ROUND1_FALLBACK = {
+    "commander":   "I’ll keep this practical. Start with one concrete move and a quick checkpoint.",
+    "rationalist": "Let’s name the assumptions, what would falsify them, and decide based on that.",
+    "dramatist":   "There’s a real tension here; acknowledge it, then choose a next beat you can own.",
+}
+
+_MENTION_RE = re.compile(r"@(commander|rationalist|dramatist)", re.I)
 
 def _parse_target(text: str) -> str | None:
-    """Detect direct mentions like @Commander in agent messages."""
-    low = (text or "").lower()
-    if "@commander" in low:   return "Commander"
-    if "@rationalist" in low: return "Rationalist"
-    if "@dramatist" in low:   return "Dramatist"
-    return None
+    """Detect direct mentions like @Commander in agent messages (first one wins)."""
+    m = _MENTION_RE.search(text or "")
+    return m.group(1).title() if m else None
 
 def _get_agent(role: str, C, R, D):
     """Return the corresponding agent object by role name."""
     return {"Commander": C, "Rationalist": R, "Dramatist": D}[role]
 
-def _safe_call(fn, fallback: str) -> Dict[str, Any]:
+@lru_cache(maxsize=None)
+def _respond_cache(persona: str) -> SemanticCache | None:
+    """
+    Per-persona Round-1 cache shared across runs, so a paraphrased question can
+    reuse one agent's answer even when the others regenerate.
+    AGENT_RESPOND_CACHE=0 disables it; AGENT_CACHE_THRESHOLD tunes the match.
+    Capped at SEMANTIC_CACHE_MAX_ENTRIES like the app-level cache, since it lives
+    as long as the process.
     """
-    Execute an agent method safely; if it errors or yields empty, return a minimal fallback.
+    if os.getenv("AGENT_RESPOND_CACHE", "1").strip() in ("", "0"):
+        return None
+    return SemanticCache(threshold=float(os.getenv("AGENT_CACHE_THRESHOLD", "0.95")),
+                         max_entries=MAX_ENTRIES)
+
+def _fallback(text: str) -> Dict[str, Any]:
+    """Canned stand-in for a failed/empty agent call; flagged so the run counts as degraded."""
+    return {"response": text, "citations": "", "hits": [], "fallback": True}
+
+def _safe_call(fn, *args, fallback: str, **kwargs) -> Dict[str, Any]:
+    """
+    Execute `fn(*args, **kwargs)` safely; if it errors or yields empty, return a minimal fallback.
     """
     try:
-        out = fn() or {}
+        out = fn(*args, **kwargs) or {}
         text = (out.get("response") or "").strip()
         if not text:
-            return {"response": fallback, "citations": "", "hits": []}
+            return _fallback(fallback)
         return out
     except Exception:
-        return {"response": fallback, "citations": "", "hits": []}
+        return _fallback(fallback)
 
-# ---------- node implementations ----------
-def init_state_node(state: GraphState) -> GraphState:
-    """Initialize all agents and shared conversation state."""
-    state["_agents"] = {
-        "C": CommanderAgent(),
-        "R": RationalistAgent(),
-        "D": DramatistAgent(),
+async def _asafe_call(coro, fallback: str) -> Dict[str, Any]:
+    """Async counterpart of `_safe_call` for awaitable agent methods."""
+    try:
+        out = (await coro) or {}
+        text = (out.get("response") or "").strip()
+        if not text:
+            return _fallback(fallback)
+        return out
+    except Exception:
+        return _fallback(fallback)
+
+def is_degraded(state: Dict[str, Any]) -> bool:
+    """True if any stage of the run fell back to canned text (e.g. Ollama was down)."""
+    parts = [*(state.get("round1") or {}).values(),
+             *(state.get("challenges") or {}).values(),
+             state.get("synthesis") or {}]
+    return bool(state.get("degraded")) or any(p.get("fallback") for p in parts)
+
+@lru_cache(maxsize=1)
+def _agents() -> Dict[str, Any]:
+    """Agents hold no per-query state, so one set serves every run."""
+    return {
+        "C": CommanderAgent(cache=_respond_cache("commander")),
+        "R": RationalistAgent(cache=_respond_cache("rationalist")),
+        "D": DramatistAgent(cache=_respond_cache("dramatist")),
         "S": SynthesizerAgent(),
     }
+
+# ---------- node implementations ----------
+def init_state_node(state: GraphState) -> GraphState:
+    """Attach the shared agents and initialize the conversation state."""
+    state["_agents"] = _agents()
     state["round1"] = {"commander": {}, "rationalist": {}, "dramatist": {}}
     state["dialogue"] = []
     state["challenges"] = {}
     state["thread"] = []
+    state["recent"] = deque(maxlen=RECENT_TURNS)
     state["role_order"] = ROLE_ORDER[:]
     state["pending_target"] = None
     state["rotation_index"] = 0
@@ -77,13 +132,37 @@ def round1_node(state: GraphState) -> GraphState:
     agents = state["_agents"]
     query = state["query"]
 
-    r1_commander = _safe_call(lambda: agents["C"].respond(query),
-                              "I’ll keep this practical. Start with one concrete move and a quick checkpoint.")
-    r1_rationalist = _safe_call(lambda: agents["R"].respond(query),
-                                "Let’s name the assumptions, what would falsify them, and decide based on that.")
-    r1_dramatist = _safe_call(lambda: agents["D"].respond(query),
-                              "There’s a real tension here; acknowledge it, then choose a next beat you can own.")
+    # independent calls: submit together so Ollama (OLLAMA_NUM_PARALLEL) can co-batch them
+    with ThreadPoolExecutor(max_workers=3) as ex:
+        f_commander = ex.submit(_safe_call, agents["C"].respond, query,
+                                fallback=ROUND1_FALLBACK["commander"])
+        f_rationalist = ex.submit(_safe_call, agents["R"].respond, query,
+                                  fallback=ROUND1_FALLBACK["rationalist"])
+        f_dramatist = ex.submit(_safe_call, agents["D"].respond, query,
+                                fallback=ROUND1_FALLBACK["dramatist"])
+    return _store_round1(state, f_commander.result(), f_rationalist.result(), f_dramatist.result())
+
+async def around1_node(state: GraphState) -> GraphState:
+    """Async Round 1: the three independent LLM calls run concurrently."""
+    agents = state["_agents"]
+    query = state["query"]
+    sink = state.get("on_token")
+
+    def _tap(key: str):
+        """Per-speaker token callback for live UI rendering (None when not streaming)."""
+        return (lambda delta: sink(key, delta)) if sink else None
 
+    r1_commander, r1_rationalist, r1_dramatist = await asyncio.gather(
+        _asafe_call(agents["C"].arespond(query, on_token=_tap("commander")),
+                    ROUND1_FALLBACK["commander"]),
+        _asafe_call(agents["R"].arespond(query, on_token=_tap("rationalist")),
+                    ROUND1_FALLBACK["rationalist"]),
+        _asafe_call(agents["D"].arespond(query, on_token=_tap("dramatist")),
+                    ROUND1_FALLBACK["dramatist"]),
+    )
+    return _store_round1(state, r1_commander, r1_rationalist, r1_dramatist)
+
+def _store_round1(state: GraphState, r1_commander, r1_rationalist, r1_dramatist) -> GraphState:
     state["round1"] = {
         "commander":   r1_commander,
         "rationalist": r1_rationalist,
@@ -95,6 +174,7 @@ def round1_node(state: GraphState) -> GraphState:
         {"speaker": "Rationalist", "message": r1_rationalist["response"], "citations": r1_rationalist.get("citations", "")},
         {"speaker": "Dramatist",   "message": r1_dramatist["response"],   "citations": r1_dramatist.get("citations", "")},
     ]
+    state["recent"] = deque(state["thread"], maxlen=RECENT_TURNS)
 
     state["phase"] = "dialogue"
     return state
@@ -108,6 +188,7 @@ def dialogue_node(state: GraphState) -> GraphState:
     agents = state["_agents"]
     query = state["query"]
     thread = state["thread"]
+    recent = state["recent"]
 
     # targeted reply (if mentioned) or round-robin fallback
     pending = state.get("pending_target")
@@ -120,8 +201,10 @@ def dialogue_node(state: GraphState) -> GraphState:
         state["rotation_index"] += 1
 
     agent = _get_agent(role, agents["C"], agents["R"], agents["D"])
-    msg = _safe_call(lambda: agent.converse(query, thread),
-                     "Noted. One clear tension and a small next step to move us forward.")
+    msg = _safe_call(agent.converse, query, recent,
+                     fallback="Noted. One clear tension and a small next step to move us forward.")
+    if msg.get("fallback"):
+        state["degraded"] = True
     text = (msg.get("response") or "").strip()
     if text:
         turn = {
@@ -131,6 +214,7 @@ def dialogue_node(state: GraphState) -> GraphState:
         }
         state["dialogue"].append(turn)
         thread.append({"speaker": role, "message": text, "citations": turn["citations"]})
+        recent.append(thread[-1])
 
         tgt = _parse_target(text)
         if tgt and tgt != role:
@@ -142,20 +226,76 @@ def dialogue_node(state: GraphState) -> GraphState:
         state["phase"] = "challenges"
     return state
 
+def _challenge_targets(r1) -> Dict[str, str]:
+    """Round-1 statements the Rationalist critiques in its fused challenge call."""
+    return {"commander": r1["commander"]["response"], "dramatist": r1["dramatist"]["response"]}
+
+def _split_challenges(both: Dict[str, Any] | None):
+    """Unpack challenge_many output into the two critiques, with per-target fallbacks."""
+    both = both or {}
+    ch_r_on_c = _safe_call(both.get, "commander",
+                           fallback="Explicit assumption, concrete test, fallback path.")
+    ch_r_on_d = _safe_call(both.get, "dramatist",
+                           fallback="Name the premise, propose a falsifier, and a backup route.")
+    return ch_r_on_c, ch_r_on_d
+
+async def _aswallow(coro) -> Dict[str, Any]:
+    """Await a multi-result agent call; errors become {} so per-target fallbacks apply."""
+    try:
+        return (await coro) or {}
+    except Exception:
+        return {}
+
+def _swallow(fn, *args) -> Dict[str, Any]:
+    """Run a multi-result agent call; errors become {} so per-target fallbacks apply."""
+    try:
+        return fn(*args) or {}
+    except Exception:
+        return {}
+
 def challenges_node(state: GraphState) -> GraphState:
-    """Challenge round: agents critique and respond to each other."""
+    """
+    Challenge round: agents critique and respond to each other.
+    The calls only depend on Round 1 (synthesis on Round 1 + dialogue), so they
+    share a thread pool, mirroring achallenges_node on the sync path.
+    """
     agents = state["_agents"]
     r1 = state["round1"]
 
-    ch_r_on_c = _safe_call(lambda: agents["R"].challenge(r1["commander"]["response"]),
-                           "Explicit assumption, concrete test, fallback path.")
-    ch_r_on_d = _safe_call(lambda: agents["R"].challenge(r1["dramatist"]["response"]),
-                           "Name the premise, propose a falsifier, and a backup route.")
-    rebut_m   = _safe_call(lambda: agents["C"].rebuttal(r1["rationalist"]["response"]),
-                           "Fair point noted. I’ll narrow scope and set a quick check-in.")
-    recon_d   = _safe_call(lambda: agents["D"].reconcile(r1["commander"]["response"], r1["rationalist"]["response"]),
-                           "Shared backbone, live tension, one next beat we agree on.")
+    with ThreadPoolExecutor(max_workers=4) as ex:
+        # one fused Rationalist generation covers both critiques
+        f_both  = ex.submit(_swallow, agents["R"].challenge_many, _challenge_targets(r1))
+        f_rebut = ex.submit(_safe_call, agents["C"].rebuttal, r1["rationalist"]["response"],
+                            fallback="Fair point noted. I’ll narrow scope and set a quick check-in.")
+        f_recon = ex.submit(_safe_call, agents["D"].reconcile,
+                            r1["commander"]["response"], r1["rationalist"]["response"],
+                            fallback="Shared backbone, live tension, one next beat we agree on.")
+        f_synth = ex.submit(_synthesize, state)
+    ch_r_on_c, ch_r_on_d = _split_challenges(f_both.result())
+    state["synthesis"] = f_synth.result()
+    return _store_challenges(state, ch_r_on_c, ch_r_on_d, f_rebut.result(), f_recon.result())
 
+async def achallenges_node(state: GraphState) -> GraphState:
+    """
+    Async challenge round: every critique only depends on Round 1, so gather them.
+    Synthesis reads Round 1 + dialogue only (never the challenges), so it is
+    started in the same gather and synthesis_node just keeps its result.
+    """
+    agents = state["_agents"]
+    r1 = state["round1"]
+
+    both, rebut_m, recon_d, state["synthesis"] = await asyncio.gather(
+        _aswallow(agents["R"].achallenge_many(_challenge_targets(r1))),
+        _asafe_call(agents["C"].arebuttal(r1["rationalist"]["response"]),
+                    "Fair point noted. I’ll narrow scope and set a quick check-in."),
+        _asafe_call(agents["D"].areconcile(r1["commander"]["response"], r1["rationalist"]["response"]),
+                    "Shared backbone, live tension, one next beat we agree on."),
+        _asynthesize(state),
+    )
+    ch_r_on_c, ch_r_on_d = _split_challenges(both)
+    return _store_challenges(state, ch_r_on_c, ch_r_on_d, rebut_m, recon_d)
+
+def _store_challenges(state: GraphState, ch_r_on_c, ch_r_on_d, rebut_m, recon_d) -> GraphState:
     state["challenges"] = {
         "rationalist_on_commander": ch_r_on_c,
         "rationalist_on_dramatist": ch_r_on_d,
@@ -165,48 +305,83 @@ def challenges_node(state: GraphState) -> GraphState:
     state["phase"] = "synthesis"
     return state
 
+def _synthesis_inputs(state: GraphState):
+    """Round-1 answers plus the live dialogue, as (speaker, response, citations) tuples."""
+    r1 = state["round1"]
+    return [
+        *[(k, r1[k].get("response", ""), r1[k].get("citations", ""))
+          for k in ("commander", "rationalist", "dramatist")],
+        *[(d["speaker"].lower(), d["message"], d.get("citations", "")) for d in state["dialogue"]],
+    ]
+
+def _templated_synthesis(state: GraphState) -> Dict[str, Any] | None:
+    """
+    Canned synthesis when Round 1 is trivial (all fallbacks, or too little text
+    to merge); None when the Synthesizer call is worth making.
+    """
+    entries = [state["round1"][k] for k in ROUND1_FALLBACK]
+    texts = [(e.get("response") or "") for e in entries]
+    all_fallback = all(t == ROUND1_FALLBACK[k] for k, t in zip(ROUND1_FALLBACK, texts))
+    if sum(map(len, texts)) >= 120 and not all_fallback:
+        return None
+    canned = {
+        "agent": "synthesis",
+        "response": (f"Consensus across perspectives: {texts[0]} Next steps: 1) Pick one concrete "
+                     "action; 2) Verify the assumption; 3) Reflect on the tension."),
+        "citations": "",
+        "hits": [],
+    }
+    # brief but genuine Round-1 answers are not a degraded run
+    if all_fallback or any(e.get("fallback") for e in entries):
+        canned["fallback"] = True
+    return canned
+
+def _synthesize(state: GraphState) -> Dict[str, Any]:
+    canned = _templated_synthesis(state)
+    if canned is not None:
+        return canned
+    return _safe_call(state["_agents"]["S"].synthesize, state["query"], _synthesis_inputs(state),
+                      fallback=SYNTHESIS_FALLBACK)
+
+async def _asynthesize(state: GraphState) -> Dict[str, Any]:
+    canned = _templated_synthesis(state)
+    if canned is not None:
+        return canned
+    return await _asafe_call(state["_agents"]["S"].asynthesize(state["query"], _synthesis_inputs(state)),
+                             SYNTHESIS_FALLBACK)
+
 def synthesis_node(state: GraphState) -> GraphState:
     """Synthesizer creates unified insight from all prior discussion."""
-    agents = state["_agents"]
-    query = state["query"]
-
-    persona_msgs = [
-        ("commander",   state["round1"]["commander"]),
-        ("rationalist", state["round1"]["rationalist"]),
-        ("dramatist",   state["round1"]["dramatist"]),
-        *[(d["speaker"].lower(), {"response": d["message"], "citations": d.get("citations", "")})
-          for d in state["dialogue"]],
-    ]
-    final = _safe_call(lambda: agents["S"].synthesize(query, persona_msgs),
-                       "Consensus: one practical path, one test for success, and next steps.")
-    state["synthesis"] = final
+    # the challenge round normally produces it alongside the critiques
+    if not state.get("synthesis"):
+        state["synthesis"] = _synthesize(state)
     state["phase"] = "done"
     return state
 
+# phase -> next node key (after round1 we always go to dialogue); anything else ends
+_PHASE_ROUTES = {
+    "round1": "dialogue",
+    "dialogue": "dialogue",
+    "challenges": "challenges",
+    "synthesis": "synthesis",
+}
+
 def router(state: GraphState) -> str:
     """
     Control flow logic — returns keys that match add_conditional_edges mappings:
       'dialogue' | 'challenges' | 'synthesis' | 'done'
     """
-    phase = state.get("phase", "")
-    if phase == "round1":
-        return "dialogue"    # after round1 we always go to dialogue
-    if phase == "dialogue":
-        return "dialogue"
-    if phase == "challenges":
-        return "challenges"
-    if phase == "synthesis":
-        return "synthesis"
-    return "done"
+    return _PHASE_ROUTES.get(state.get("phase", ""), "done")
 
 def build_graph():
-    """Builds and compiles the LangGraph workflow."""
+    """Builds and compiles the LangGraph workflow (see `get_graph` for the cached one)."""
     g = StateGraph(GraphState)
 
     g.add_node("init",       init_state_node)
-    g.add_node("round1",     round1_node)
+    # sync invoke() runs the plain nodes; ainvoke() uses the concurrent async twins
+    g.add_node("round1",     RunnableLambda(round1_node, afunc=around1_node))
     g.add_node("dialogue",   dialogue_node)
-    g.add_node("challenges", challenges_node)
+    g.add_node("challenges", RunnableLambda(challenges_node, afunc=achallenges_node))
     g.add_node("synthesis",  synthesis_node)
 
     g.set_entry_point("init")
@@ -235,4 +410,9 @@ def build_graph():
         "done": END,
     })
 
-    return g.compile()
\ No newline at end of file
+    return g.compile()
+
+@lru_cache(maxsize=1)
+def get_graph():
+    """The topology is static: compile it once per process and reuse it."""
+    return build_graph()
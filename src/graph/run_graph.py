@@ -1,7 +1,7 @@
 # src/graph/run_graph.py
 from __future__ import annotations
 from typing import Dict, Any
-from src.graph.langgraph_builder import build_graph
+from src.graph.langgraph_builder import get_graph, is_degraded
 from src.graph.state import GraphState
 
 def run_collaboration_graph(query: str, dialogue_rounds: int = 2) -> Dict[str, Any]:
@@ -9,7 +9,7 @@ def run_collaboration_graph(query: str, dialogue_rounds: int = 2) -> Dict[str, A
     Execute the LangGraph workflow and return a dict that matches the shape
     expected by the Streamlit UI and/or the legacy orchestrator output.
     """
-    graph = build_graph()
+    graph = get_graph()
 
     # Seed initial state (init node fills in the rest)
     initial: GraphState = {
@@ -22,17 +22,43 @@ def run_collaboration_graph(query: str, dialogue_rounds: int = 2) -> Dict[str, A
         final_state: GraphState = graph.invoke(initial)  # type: ignore
     except Exception:
         # Ensure we *always* return the expected keys so the UI never crashes
-        return {
-            "round1": {},
-            "dialogue": [],
-            "challenges": {},
-            "synthesis": {},
-        }
+        return _empty_result()
+    return _shape_result(final_state)
 
+async def arun_collaboration_graph(query: str, dialogue_rounds: int = 2,
+                                   on_token=None) -> Dict[str, Any]:
+    """
+    Async variant of `run_collaboration_graph`: uses `ainvoke` so the Round-1 and
+    challenge fan-outs run their agent calls concurrently.
+    `on_token(key, delta)` receives Round-1 tokens as they stream in.
+    """
+    graph = get_graph()
+    initial: GraphState = {
+        "query": query,
+        "dialogue_rounds": int(dialogue_rounds) if dialogue_rounds is not None else 2,
+        "on_token": on_token,
+    }
+    try:
+        final_state: GraphState = await graph.ainvoke(initial)  # type: ignore
+    except Exception:
+        return _empty_result()
+    return _shape_result(final_state)
+
+def _empty_result() -> Dict[str, Any]:
+    return {
+        "round1": {},
+        "dialogue": [],
+        "challenges": {},
+        "synthesis": {},
+        "degraded": True,
+    }
+
+def _shape_result(final_state: GraphState) -> Dict[str, Any]:
     # Shape the return exactly like orchestrator/app expects
     return {
         "round1": final_state.get("round1", {}),
         "dialogue": final_state.get("dialogue", []),
         "challenges": final_state.get("challenges", {}),
         "synthesis": final_state.get("synthesis", {}),
+        "degraded": is_degraded(final_state),
     }
\ No newline at end of file
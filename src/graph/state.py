@@ -1,6 +1,7 @@
 # src/graph/state.py
 from __future__ import annotations
-from typing import TypedDict, List, Dict, Any, Optional
+from collections import deque
+from typing import TypedDict, List, Dict, Any, Optional, Callable
 
 
 class Message(TypedDict):
@@ -26,15 +27,18 @@ class GraphState(TypedDict, total=False):
     # inputs
     query: str
     dialogue_rounds: int
+    on_token: Optional[Callable[[str, str], None]]  # (round1 key, delta) live-stream sink
 
     # outputs we’re building
     round1: Round1
     dialogue: List[Message]
     challenges: Challenges
     synthesis: Dict[str, Any]
+    degraded: bool                  # some stage used canned fallback text
 
     # internal working memory
     thread: List[Message]           # public transcript (speaker/message)
+    recent: deque                   # last RECENT_TURNS of thread; what converse() sees
     role_order: List[str]           # fixed order for live dialogue
     pending_target: Optional[str]   # next targeted speaker (from @mentions)
     rotation_index: int             # pointer for round-robin
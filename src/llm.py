@@ -1,11 +1,83 @@
 # src/llm.py
-import os, time, json, requests
+import os, json, time, atexit, asyncio, logging, threading, weakref, requests
+import httpx
+from concurrent.futures import Future
+from requests.adapters import HTTPAdapter
+from typing import AsyncIterator, Callable, Iterator
+
+try:  # one parse per streamed token: use the faster C parser when installed
+    import orjson as _json
+except ImportError:
+    import json as _json
 
 OLLAMA_URL = os.getenv("OLLAMA_URL", "http://127.0.0.1:11434")
+log = logging.getLogger(__name__)
+
+# short reactive turns (converse/rebuttal/reconcile) run on a smaller, faster model
+MODEL = os.getenv("AGENT_MODEL", "llama3")
+SMALL_MODEL = os.getenv("AGENT_SMALL_MODEL", "llama3.2:3b")
+
+# keep-alive: one session for every sync call, one AsyncClient per event loop
+_SESSION = requests.Session()
+# default pool keeps 10 sockets per host; size it for the concurrent fan-outs
+# (Round 1 + challenge round threads) so parallel calls never open throwaway sockets
+_SESSION.mount("http://", HTTPAdapter(pool_connections=8, pool_maxsize=16))
+_SESSION.mount("https://", HTTPAdapter(pool_connections=8, pool_maxsize=16))
+atexit.register(_SESSION.close)
+_ACLIENTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+def _aclient() -> httpx.AsyncClient:
+    """Shared AsyncClient for the running loop (httpx pools can't cross loops)."""
+    loop = asyncio.get_running_loop()
+    client = _ACLIENTS.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(timeout=httpx.Timeout(120, connect=5))
+        _ACLIENTS[loop] = client
+    return client
+
+async def aclose():
+    """Close the running loop's AsyncClient; call before the loop shuts down."""
+    client = _ACLIENTS.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+# single-flight: identical requests already in flight (e.g. two UI sessions asking the
+# same question) share one generation instead of each occupying an Ollama slot.
+# One process-wide table of concurrent Futures serves `chat` and `achat` alike, so
+# calls from different threads and event loops (each query has its own) are merged.
+_INFLIGHT: "dict[str, Future]" = {}
+_INFLIGHT_LOCK = threading.Lock()
+
+def _flight_key(model: str, messages: list[dict], options: dict | None) -> str:
+    # stdlib json either way, so the key is a str whether or not orjson is installed
+    return json.dumps([model, messages, options or {}], sort_keys=True)
+
+def _join_flight(key: str) -> tuple[Future, bool]:
+    """Return (future, leader): the caller that created the future must resolve it."""
+    with _INFLIGHT_LOCK:
+        fut = _INFLIGHT.get(key)
+        if fut is not None:
+            return fut, False
+        fut = _INFLIGHT[key] = Future()
+        return fut, True
+
+def _end_flight(key: str):
+    with _INFLIGHT_LOCK:
+        _INFLIGHT.pop(key, None)
+
+def _follower_budget(timeout: int, max_retries: int) -> float:
+    """How long a follower waits on the leader: its own retries plus the fallback."""
+    return timeout * (max_retries + 2)
+
+def warn_if_short(text: str, where: str, min_chars: int = 30) -> str:
+    """Log (don't retry) a suspiciously short generation; returns `text` unchanged."""
+    if len(text) < min_chars:
+        log.warning("%s returned a short reply (%d chars)", where, len(text))
+    return text
 
 def warm_up(model: str = "llama3"):
     try:
-        requests.get(f"{OLLAMA_URL}/api/tags", timeout=5)
+        _SESSION.get(f"{OLLAMA_URL}/api/tags", timeout=5)
     except Exception:
         return
     try:
@@ -20,6 +92,51 @@ def warm_up(model: str = "llama3"):
     except Exception:
         pass
 
+def _build_payload(model: str, messages: list[dict], options: dict | None, stream: bool) -> dict:
+    """Apply the shared decode defaults and build an /api/chat payload."""
+    opts = dict(options or {})
+    max_np = int(os.getenv("AGENT_NUM_PREDICT", "384"))  # default a bit smaller
+    opts.setdefault("num_predict", max_np)
+    opts.setdefault("temperature", 0.3)
+    opts.setdefault("top_p", 0.9)
+    opts.setdefault("repeat_penalty", 1.05)
+    return {"model": model, "messages": messages, "stream": bool(stream), "options": opts}
+
+def _delta(line: bytes | str) -> str:
+    """Content delta of one NDJSON stream line ('' for keep-alives / bad lines).
+    Both parsers take the raw bytes, so lines are never decoded separately."""
+    try:
+        j = _json.loads(line)
+    except ValueError:  # json / orjson JSONDecodeError
+        return ""
+    return (j.get("message") or {}).get("content") or ""
+
+def chat_stream(model: str,
+                messages: list[dict],
+                options: dict | None = None,
+                timeout: int = 90) -> Iterator[str]:
+    """
+    Yield content deltas from Ollama as they are decoded (no retries / fallback;
+    `chat` layers those on top).
+    """
+    url = f"{OLLAMA_URL}/api/chat"
+    payload = _build_payload(model, messages, options, stream=True)
+    with _SESSION.post(url, json=payload, timeout=timeout, stream=True) as r:
+        r.raise_for_status()
+        for line in r.iter_lines(decode_unicode=False):
+            if not line:
+                continue
+            chunk = _delta(line)
+            if chunk:
+                yield chunk
+
+def _content(data: dict) -> str:
+    return (data.get("message") or {}).get("content") or ""
+
+def _fallback_options(opts: dict) -> dict:
+    """Bigger decode budget for the one non-stream retry after an empty stream."""
+    return dict(opts, num_predict=max(int(opts.get("num_predict", 384)) + 256, 640))
+
 def chat(model: str,
          messages: list[dict],
          options: dict | None = None,
@@ -27,61 +144,65 @@ def chat(model: str,
          max_retries: int = 2,
          stream: bool = True) -> str:
     """
+    Robust chat wrapper for Ollama (see `_chat`). Concurrent calls with the same
+    model, messages and options are coalesced: the first caller generates, the
+    others wait on its result, for at most their own retry budget.
+    """
+    key = _flight_key(model, messages, options)
+    fut, leader = _join_flight(key)
+    if not leader:
+        return fut.result(timeout=_follower_budget(timeout, max_retries))
+    try:
+        text = _chat(model, messages, options, timeout, max_retries, stream)
+        fut.set_result(text)
+        return text
+    except BaseException as e:
+        fut.set_exception(e)
+        raise
+    finally:
+        _end_flight(key)
+
+def _chat(model: str,
+          messages: list[dict],
+          options: dict | None = None,
+          timeout: int = 90,
+          max_retries: int = 2,
+          stream: bool = True) -> str:
+    """
     Robust chat wrapper for Ollama.
     - Streams + accumulates chunks.
-    - Retries on timeouts/conn errors.
-    - **If streaming yields empty content, auto-fallback to a non-stream call with larger decode budget.**
+    - Retries on timeouts/conn errors, unless the attempt already produced tokens
+      (then the partial text is returned rather than regenerated).
+    - At most ONE non-stream fallback: after an empty stream (with a larger decode
+      budget) or once retries are exhausted.
+    Returns the raw generated text; callers strip once at their own boundary.
     """
     url = f"{OLLAMA_URL}/api/chat"
 
-    opts = dict(options or {})
-    import os
-    max_np = int(os.getenv("AGENT_NUM_PREDICT", "384"))  # default a bit smaller
-    opts.setdefault("num_predict", max_np)
-    opts.setdefault("temperature", 0.3)
-    opts.setdefault("top_p", 0.9)
-    opts.setdefault("repeat_penalty", 1.05)
-
-    payload = {"model": model, "messages": messages, "stream": bool(stream), "options": opts}
+    payload = _build_payload(model, messages, options, stream)
+    opts = payload["options"]
     last_err = None
 
     for attempt in range(max_retries + 1):
+        # collect deltas and join once (no quadratic string rebuilds)
+        parts = []
         try:
-            if stream:
-                content = ""
-                with requests.post(url, json=payload, timeout=timeout, stream=True) as r:
-                    r.raise_for_status()
-                    for line in r.iter_lines():
-                        if not line:
-                            continue
-                        try:
-                            j = json.loads(line.decode("utf-8"))
-                        except json.JSONDecodeError:
-                            continue
-                        chunk = (j.get("message") or {}).get("content") or ""
-                        if chunk:
-                            content += chunk
-                # empty-stream fallback (no exception; just no tokens produced)
-                if content.strip():
-                    return content.strip()
-                # one-shot non-stream fallback with a bit more budget
-                fallback_payload = dict(payload)
-                fallback_payload["stream"] = False
-                fallback_opts = dict(opts)
-                fallback_opts["num_predict"] = max(int(opts.get("num_predict", 512)) + 256, 640)
-                fallback_payload["options"] = fallback_opts
-                r2 = requests.post(url, json=fallback_payload, timeout=timeout)
-                r2.raise_for_status()
-                data = r2.json()
-                return ((data.get("message") or {}).get("content") or "").strip()
-
-            else:
-                r = requests.post(url, json=payload, timeout=timeout)
+            if not stream:
+                r = _SESSION.post(url, json=payload, timeout=timeout)
                 r.raise_for_status()
-                data = r.json()
-                return ((data.get("message") or {}).get("content") or "").strip()
-
+                return _content(r.json())
+            for chunk in chat_stream(model, messages, opts, timeout=timeout):
+                parts.append(chunk)
+            content = "".join(parts)
+            if content and not content.isspace():
+                return content
+            # the server answered but produced no tokens: retrying the same request
+            # won't help, so go straight to the fallback with a bigger budget
+            opts = _fallback_options(opts)
+            break
         except (requests.exceptions.ReadTimeout, requests.exceptions.ConnectionError) as e:
+            if parts:
+                return "".join(parts)
             last_err = e
             time.sleep(0.6 * (attempt + 1))
             continue
@@ -89,12 +210,117 @@ def chat(model: str,
             last_err = e
             break
 
-    # final non-stream fallback if retries were exhausted
+    # single non-stream fallback (empty stream, exhausted retries, or other errors)
+    try:
+        r = _SESSION.post(url, json=dict(payload, stream=False, options=opts), timeout=timeout)
+        r.raise_for_status()
+        return _content(r.json())
+    except Exception as e:
+        raise last_err or e
+
+
+async def achat_stream(model: str,
+                       messages: list[dict],
+                       options: dict | None = None,
+                       timeout: int = 90) -> AsyncIterator[str]:
+    """Async generator of content deltas over the loop's shared httpx client."""
+    url = f"{OLLAMA_URL}/api/chat"
+    payload = _build_payload(model, messages, options, stream=True)
+    async with _aclient().stream("POST", url, json=payload, timeout=timeout) as r:
+        r.raise_for_status()
+        async for line in r.aiter_lines():
+            if not line:
+                continue
+            chunk = _delta(line)
+            if chunk:
+                yield chunk
+
+async def achat(model: str,
+                messages: list[dict],
+                options: dict | None = None,
+                timeout: int = 90,
+                max_retries: int = 2,
+                stream: bool = True,
+                on_token: Callable[[str], None] | None = None) -> str:
+    """
+    Async twin of `chat` built on httpx, so independent agent calls can be
+    fanned out with asyncio.gather instead of running back to back.
+    Same retry / single-fallback policy as the sync wrapper; returning partial
+    text instead of retrying also keeps `on_token` from seeing a reply twice.
+    `on_token` (stream mode only) receives each decoded delta as it arrives.
+    Identical in-flight calls are coalesced with `chat`'s process-wide table, so
+    queries running on different loops share one generation; a follower's
+    `on_token` receives the leader's finished reply as a single delta.
+    """
+    key = _flight_key(model, messages, options)
+    fut, leader = _join_flight(key)
+    if not leader:
+        # shield: a follower timing out must not cancel the Future the others await
+        text = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(fut)),
+                                      _follower_budget(timeout, max_retries))
+        if on_token and text:
+            on_token(text)
+        return text
+    task = asyncio.ensure_future(_achat(model, messages, options, timeout, max_retries, stream, on_token))
+
+    def _resolve(t: asyncio.Task):
+        _end_flight(key)
+        if t.cancelled():
+            fut.cancel()
+        elif t.exception() is not None:
+            fut.set_exception(t.exception())
+        else:
+            fut.set_result(t.result())
+
+    task.add_done_callback(_resolve)
+    # shield: a cancelled leader must not cancel the generation the followers await
+    return await asyncio.shield(task)
+
+async def _achat(model: str,
+                 messages: list[dict],
+                 options: dict | None = None,
+                 timeout: int = 90,
+                 max_retries: int = 2,
+                 stream: bool = True,
+                 on_token: Callable[[str], None] | None = None) -> str:
+    """Uncoalesced body of `achat`."""
+    url = f"{OLLAMA_URL}/api/chat"
+
+    payload = _build_payload(model, messages, options, stream)
+    opts = payload["options"]
+    last_err = None
+
+    client = _aclient()
+    for attempt in range(max_retries + 1):
+        parts = []
+        try:
+            if not stream:
+                r = await client.post(url, json=payload, timeout=timeout)
+                r.raise_for_status()
+                return _content(r.json())
+            async for chunk in achat_stream(model, messages, opts, timeout=timeout):
+                parts.append(chunk)
+                if on_token:
+                    on_token(chunk)
+            content = "".join(parts)
+            if content and not content.isspace():
+                return content
+            opts = _fallback_options(opts)
+            break
+        except (httpx.TimeoutException, httpx.ConnectError) as e:
+            if parts:
+                return "".join(parts)
+            last_err = e
+            await asyncio.sleep(0.6 * (attempt + 1))
+            continue
+        except Exception as e:
+            last_err = e
+            break
+
+    # single non-stream fallback (empty stream, exhausted retries, or other errors)
     try:
-        payload["stream"] = False
-        r = requests.post(url, json=payload, timeout=timeout)
+        r = await client.post(url, json=dict(payload, stream=False, options=opts), timeout=timeout)
         r.raise_for_status()
-        data = r.json()
-        return ((data.get("message") or {}).get("content") or "").strip()
+        return _content(r.json())
     except Exception as e:
-        raise last_err or e
\ No newline at end of file
+        raise last_err or e
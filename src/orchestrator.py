@@ -1,6 +1,7 @@
 # src/orchestrator.py
 from typing import Dict, Any
-from src.graph.run_graph import run_collaboration_graph
+from src import llm
+from src.graph.run_graph import run_collaboration_graph, arun_collaboration_graph
 
 def run_collaboration(query: str, dialogue_rounds: int = 2) -> Dict[str, Any]:
     """
@@ -11,13 +12,32 @@ def run_collaboration(query: str, dialogue_rounds: int = 2) -> Dict[str, Any]:
         return run_collaboration_graph(query, dialogue_rounds=dialogue_rounds)
     except Exception as e:
         # Fallback keeps UI rendering even if graph hiccups
-        return {
-            "round1": {
-                "commander":   {"response": "Temporarily unavailable.", "citations": ""},
-                "rationalist": {"response": "Temporarily unavailable.", "citations": ""},
-                "dramatist":   {"response": "Temporarily unavailable.", "citations": ""},
-            },
-            "dialogue": [],
-            "challenges": {},
-            "synthesis": {"response": f"(Graph error: {e})", "citations": "", "hits": []},
-        }
\ No newline at end of file
+        return _fallback(e)
+
+async def arun_collaboration(query: str, dialogue_rounds: int = 2, on_token=None) -> Dict[str, Any]:
+    """
+    Async entry point: Round-1 and challenge calls are fanned out concurrently
+    against Ollama. Same return schema as `run_collaboration`.
+    Pass `on_token(key, delta)` to receive Round-1 tokens live.
+    """
+    try:
+        return await arun_collaboration_graph(query, dialogue_rounds=dialogue_rounds,
+                                              on_token=on_token)
+    except Exception as e:
+        return _fallback(e)
+    finally:
+        # the pooled AsyncClient belongs to this event loop; release it with the run
+        await llm.aclose()
+
+def _fallback(e: Exception) -> Dict[str, Any]:
+    return {
+        "round1": {
+            "commander":   {"response": "Temporarily unavailable.", "citations": ""},
+            "rationalist": {"response": "Temporarily unavailable.", "citations": ""},
+            "dramatist":   {"response": "Temporarily unavailable.", "citations": ""},
+        },
+        "dialogue": [],
+        "challenges": {},
+        "synthesis": {"response": f"(Graph error: {e})", "citations": "", "hits": []},
+        "degraded": True,
+    }
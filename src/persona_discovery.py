@@ -5,13 +5,15 @@ from pathlib import Path
 from sklearn.cluster import KMeans
 from sklearn.decomposition import PCA
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sentence_transformers import SentenceTransformer
 from nltk.sentiment import SentimentIntensityAnalyzer
 from collections import Counter
 
+from src.embed_model import get_encoder, configure_torch
+
 DATA_LINES = Path("data/processed/lines.csv")
 OUT_DIR = Path("data/processed/personas")
 ANALYSIS_JSON = Path("data/processed/persona_analysis.json")
+PERSONAS_PARQUET = OUT_DIR / "personas.parquet"
 
 # --- Regex patterns for tone/style ---
 HEDGE_RE = re.compile(r"\b(maybe|perhaps|i think|i guess|it seems|might|could|sort of|kind of|possibly|likely|probably)\b", re.I)
@@ -23,49 +25,47 @@ def clean_df(df: pd.DataFrame) -> pd.DataFrame:
     df["text"] = df["text"].astype(str).str.strip()
     df = df[df["text"].str.len() > 10]
     df = df[~df["text"].str.match(r"^[\W_]+$")]
-    return df
+    # lowercased once for the stylistic regex counts; embeddings keep the cased text
+    # (assign: df is a filtered view here, so in-place column writes would warn)
+    return df.assign(text_low=df["text"].str.lower())
 
 def compute_character_features(df: pd.DataFrame) -> pd.DataFrame:
     """
     Aggregate all lines by character and compute semantic + stylistic features.
     """
     sia = SentimentIntensityAnalyzer()
-    model = SentenceTransformer("all-MiniLM-L6-v2")
-
-    features = []
-    characters = []
-    texts = []
-
-    for char, group in df.groupby("character"):
-        lines = group["text"].tolist()
-        if len(lines) < 5:
-            continue  # skip minor characters
-        joined = " ".join(lines[:200])  # cap to avoid memory blow-up
-        emb = model.encode(joined, normalize_embeddings=True)
-        low = joined.lower()
-        sent = sia.polarity_scores(joined)
-
-        # stylistic cues
-        question_ratio = joined.count("?") / max(1, len(lines))
-        exclaim_ratio = joined.count("!") / max(1, len(lines))
-        hedge = len(HEDGE_RE.findall(low)) / max(1, len(lines))
-        certainty = len(CERTAINTY_RE.findall(low)) / max(1, len(lines))
-        imperative = len(IMPER_RE.findall(low)) / max(1, len(lines))
-        word_count = len(joined.split())
-
-        feats = np.concatenate([
-            emb,
-            np.array([
-                question_ratio, exclaim_ratio, hedge, certainty,
-                imperative, sent["neg"], sent["neu"], sent["pos"], sent["compound"], word_count/1000
-            ])
-        ])
-        features.append(feats)
-        characters.append(char)
-        texts.append(joined)
-
-    feats_arr = np.vstack(features)
-    dfc = pd.DataFrame({"character": characters, "text": texts})
+    # per-character texts join up to 200 lines: keep the model's full 256-token window
+    model = get_encoder(max_seq_length=None)
+
+    grp = df.groupby("character")["text"]
+    n_lines = grp.size()
+    n_lines = n_lines[n_lines >= 5]  # skip minor characters
+    grp = df[df["character"].isin(n_lines.index)].groupby("character")
+
+    def _join(g):
+        return " ".join(g.iloc[:200])  # cap to avoid memory blow-up
+
+    joined = grp["text"].agg(_join)
+    low = grp["text_low"].agg(_join)
+    sent = pd.DataFrame([sia.polarity_scores(t) for t in joined], index=joined.index)
+
+    # stylistic cues, one vectorized str op per feature across all characters
+    style_feats = np.column_stack([
+        joined.str.count(r"\?") / n_lines,
+        joined.str.count("!") / n_lines,
+        low.str.count(HEDGE_RE.pattern) / n_lines,
+        low.str.count(CERTAINTY_RE.pattern) / n_lines,
+        low.str.count(IMPER_RE.pattern) / n_lines,
+        sent["neg"], sent["neu"], sent["pos"], sent["compound"],
+        joined.str.count(r"\S+") / 1000,
+    ])
+
+    # every character in one encode call (SBERT batches + length-sorts internally)
+    texts = joined.tolist()
+    embs = model.encode(texts, batch_size=64, normalize_embeddings=True,
+                        show_progress_bar=True, convert_to_numpy=True).astype(np.float32, copy=False)
+    feats_arr = np.hstack([embs, style_feats.astype(np.float32)])
+    dfc = pd.DataFrame({"character": joined.index.tolist(), "text": texts})
     return dfc, feats_arr
 
 def cluster_personas(df_char: pd.DataFrame, X: np.ndarray, k=3):
@@ -114,12 +114,18 @@ def discover_personas(k=3):
     OUT_DIR.mkdir(parents=True, exist_ok=True)
     name_map = {0: "commander", 1: "rationalist", 2: "dramatist"} if k == 3 else {i: f"persona_{i}" for i in range(k)}
 
+    subs = []
     for i in range(k):
         chars = df_char[df_char["cluster"] == i]["character"].tolist()
-        sub = df[df["character"].isin(chars)]
+        sub = df.loc[df["character"].isin(chars), df.columns != "text_low"]
         out = OUT_DIR / f"{name_map[i]}.csv"
         sub.to_csv(out, index=False)
         print(f"✅ Saved {out} with {len(sub)} lines ({len(chars)} characters)")
+        subs.append(sub.assign(persona=name_map[i]))
+
+    # every persona's lines in one columnar file (read by sample_personas.py)
+    pd.concat(subs, ignore_index=True).to_parquet(PERSONAS_PARQUET, index=False)
+    print(f"✅ Saved {PERSONAS_PARQUET}")
 
     # Write analysis
     analysis = {
@@ -131,4 +137,5 @@ def discover_personas(k=3):
     print(f"📝 Analysis written to {ANALYSIS_JSON}")
 
 if __name__ == "__main__":
+    configure_torch()
     discover_personas(k=3)
@@ -2,49 +2,72 @@
 import os
 import pandas as pd
 
+try:  # C parser; ships with streamlit. The pure-Python reader below stays as fallback
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    from pyarrow import csv as pacsv
+except ImportError:
+    pa = pc = pacsv = None
+
+COLUMNS = ["line_id", "char_id", "movie_id", "character", "text"]
+RAW_HEADER = ["lineID", "characterID", "movieID", "character", "text"]
+
+def _read_tsv_arrow(path) -> pd.DataFrame:
+    """
+    Read each line as one string cell with pyarrow's multithreaded C reader (row
+    order is preserved), then split on the first four tabs with Arrow compute, so
+    tabs inside the text stay in the text field and file order matches the Python
+    reader. Rows with < 5 fields are dropped.
+    """
+    tbl = pacsv.read_csv(
+        path,
+        read_options=pacsv.ReadOptions(column_names=["line"]),
+        # \x1f (unit separator) never occurs in the corpus; if it did, the row is
+        # rejected, read_csv raises and load_movie_lines falls back to Python
+        parse_options=pacsv.ParseOptions(delimiter="\x1f", quote_char=False),
+        convert_options=pacsv.ConvertOptions(column_types={"line": pa.string()}),
+    )
+    parts = pc.split_pattern(tbl.column("line"), "\t", max_splits=4)
+    parts = pc.filter(parts, pc.equal(pc.list_value_length(parts), 5))
+    df = pd.DataFrame({c: pc.list_element(parts, i).to_pandas() for i, c in enumerate(COLUMNS)})
+    if len(df) and df.iloc[0].tolist() == RAW_HEADER:
+        df = df.iloc[1:]
+    return df.reset_index(drop=True)
+
+def _clean(df: pd.DataFrame) -> pd.DataFrame:
+    """Strip text and drop empty lines in one boolean-mask pass."""
+    text = df["text"].astype(str).str.strip()
+    keep = text.str.len() > 0
+    return df.assign(text=text)[keep].reset_index(drop=True)
+
 def load_movie_lines(path="data/raw/movie_data/movie_lines.tsv"):
-    rows = []
+    if pacsv is not None:
+        try:
+            return _clean(_read_tsv_arrow(path))
+        except Exception:
+            # e.g. bytes that aren't valid UTF-8: the Python reader ignores those
+            pass
+    return _clean(_load_movie_lines_py(path))
+
+def _load_movie_lines_py(path):
+    # one list per column: pd.DataFrame(dict of lists) skips the per-row dicts
+    cols = {c: [] for c in COLUMNS}
+    appends = [cols[c].append for c in COLUMNS]
     with open(path, "r", encoding="utf-8", errors="ignore") as f:
-        # skip header if present
-        header = f.readline().strip().split("\t")
-        has_header = header[:5] == ["lineID", "characterID", "movieID", "character", "text"]
-        if not has_header:
-            # first line is data; process it and continue
-            parts = header
-            # Ensure exactly 5 fields: lineID, characterID, movieID, character, text
-            if len(parts) >= 5:
-                first = parts[:4]
-                text = "\t".join(parts[4:])  # rejoin any extra tabs into text
-                rows.append({
-                    "line_id": first[0],
-                    "char_id": first[1],
-                    "movie_id": first[2],
-                    "character": first[3],
-                    "text": text
-                })
-        # process rest of file
-        for line in f:
-            parts = line.rstrip("\n").split("\t")
+        for i, line in enumerate(f):
+            # maxsplit=4 keeps any extra tabs inside the text field
+            parts = line.rstrip("\r\n").split("\t", 4)
             if len(parts) < 5:
-                # skip weird short lines
-                continue
-            first = parts[:4]
-            text = "\t".join(parts[4:])  # glue back extra tabs into text field
-            rows.append({
-                "line_id": first[0],
-                "char_id": first[1],
-                "movie_id": first[2],
-                "character": first[3],
-                "text": text
-            })
-    return pd.DataFrame(rows)
+                continue  # skip weird short lines
+            if i == 0 and parts == RAW_HEADER:
+                continue  # skip header if present
+            for append, v in zip(appends, parts):
+                append(v)
+    return pd.DataFrame(cols)
 
 if __name__ == "__main__":
     os.makedirs("data/processed", exist_ok=True)
-    df = load_movie_lines()
-    # Basic cleanup
-    df["text"] = df["text"].astype(str).str.strip()
-    df = df[df["text"].str.len() > 0]
+    df = load_movie_lines()  # already stripped, empty lines dropped
     df.to_csv("data/processed/lines.csv", index=False)
     print("✅ Saved processed lines to data/processed/lines.csv")
     print(df.head())
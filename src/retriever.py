@@ -1,59 +1,118 @@
 # src/retriever.py
 import os
 import json
+import weakref
+from functools import lru_cache
+from itertools import count
 import faiss
 import numpy as np
-from sentence_transformers import SentenceTransformer
+import pandas as pd
+
+try:  # columnar meta reader (ships with streamlit); JSONL remains the fallback format
+    from pyarrow import feather
+except ImportError:
+    feather = None
+
+from src.build_indices import load_index
+from src.embed_model import encode_query, get_encoder
+
+# the three agents search concurrently and each query is tiny: let the outer threads
+# carry the parallelism instead of every FAISS call spinning up a full OpenMP team
+# (the build scripts never import this module and keep every core)
+faiss.omp_set_num_threads(int(os.getenv("RETRIEVER_THREADS", "1")))
 
 # ---- simple heuristics --------------------------------------------------------
-def _length_ok(t: str, min_tokens=5, max_chars=220) -> bool:
-    t = (t or "").strip()
-    return len(t.split()) >= min_tokens and len(t) <= max_chars
+# one-word interjections that never make a useful citation
+_BAD = ["yes", "no", "what", "well?", "okay?", "ok?", "okay", "huh", "uh"]
 
-def _informative(t: str) -> bool:
-    # avoid one-word interjections / empties
-    bad = {"yes", "no", "what", "well?", "okay?", "ok?", "okay", "huh", "uh"}
-    tok = (t or "").lower().strip()
-    return len(tok) > 3 and tok not in bad
+def _quality_mask(texts, min_tokens=5, max_chars=220) -> np.ndarray:
+    """
+    Boolean keep-mask over raw texts, evaluated column-wise: at least `min_tokens`
+    words, at most `max_chars` chars, and not an empty / one-word interjection.
+    """
+    t = pd.Series(texts, dtype=object).fillna("").astype(str).str.strip()
+    low = t.str.lower()
+    return ((t.str.count(r"\S+") >= min_tokens) & (t.str.len() <= max_chars)
+            & (low.str.len() > 3) & ~low.isin(_BAD)).to_numpy(dtype=bool)
 
 def _mmr(query_vec: np.ndarray, cand_vecs: np.ndarray, lambda_mult=0.7, k=3):
     """
     Simple MMR on unit-normalized vectors (cosine via dot).
     query_vec: (d,), cand_vecs: (n,d) both normalized.
+    Pairwise similarities come from one (n,n) matmul; each pick then only
+    folds the newest column into a running max-redundancy vector.
     """
     selected = []
     n = cand_vecs.shape[0]
-    if n == 0:
+    if n == 0 or k <= 0:
         return selected
-    candidates = list(range(n))
-    sims = cand_vecs @ query_vec  # (n,)
-
-    while candidates and len(selected) < k:
-        if not selected:
-            # pick the best similarity among remaining
-            best_idx = max(candidates, key=lambda ii: sims[ii])
-            candidates.remove(best_idx)
-            selected.append(best_idx)
-            continue
-
-        def score(ii):
-            # penalize redundancy vs. already selected
-            max_sim_sel = max(cand_vecs[ii] @ cand_vecs[s] for s in selected)
-            return lambda_mult * sims[ii] - (1 - lambda_mult) * max_sim_sel
-
-        best_idx = max(candidates, key=score)
-        candidates.remove(best_idx)
+    # dense float32 for the BLAS calls (no-op for encoder / stored-vector output)
+    cand_vecs = np.ascontiguousarray(cand_vecs, dtype=np.float32)
+    query_vec = np.ascontiguousarray(query_vec, dtype=np.float32)
+    sims = cand_vecs @ query_vec        # (n,)
+    S = cand_vecs @ cand_vecs.T         # (n,n)
+    max_sim_sel = np.full(n, -np.inf)   # redundancy vs. already selected
+    limit = min(k, n)
+
+    # first pick: best similarity
+    best_idx = int(np.argmax(sims))
+    while True:
         selected.append(best_idx)
+        if len(selected) >= limit:
+            return selected
+        # penalize redundancy vs. already selected
+        np.maximum(max_sim_sel, S[:, best_idx], out=max_sim_sel)
+        score = lambda_mult * sims - (1 - lambda_mult) * max_sim_sel
+        score[selected] = -np.inf       # k is tiny: index the picks, no O(n) mask
+        best_idx = int(np.argmax(score))
+
+# personas with at most this many usable lines skip FAISS and score them directly
+SMALL_PERSONA = 32
+# k=1 searches whose top ANN hit scores at least this return it without MMR
+EXACT_HIT = float(os.getenv("RETRIEVER_EXACT_HIT", "0.95"))
 
-    return selected
+# ---- shared instances ---------------------------------------------------------
+@lru_cache(maxsize=None)
+def get_retriever(persona: str, base: str = "data/processed/personas") -> "PersonaRetriever":
+    """Process-wide PersonaRetriever per persona, so each index/meta loads once."""
+    return PersonaRetriever(persona, base)
+
+def _ann_search(index, Q: np.ndarray, n: int):
+    """`index.search` with HNSW's beam widened to at least the candidate count."""
+    hnsw = getattr(index, "hnsw", None)
+    if hnsw is not None:
+        hnsw.efSearch = max(64, n)
+    return index.search(Q, n)
+
+# ---- result cache -------------------------------------------------------------
+# live retrievers by (base, persona, version); the memoized search resolves instances here.
+# Every load gets a fresh version, so results cached against a reloaded index/meta are
+# never served again (they just age out of the LRU).
+_INSTANCES: "weakref.WeakValueDictionary[tuple, PersonaRetriever]" = weakref.WeakValueDictionary()
+_VERSION = count(1)
+
+def _normalize_query(query: str) -> str:
+    """Cache-key form of a query. The encoder is uncased and tokenization ignores
+    whitespace runs, so this never changes the embedding, only the hit rate."""
+    return " ".join((query or "").split()).lower()
+
+@lru_cache(maxsize=2048)
+def _cached_search(key: tuple, query: str, k: int, initial: int, lambda_mmr: float) -> tuple:
+    """Memoized PersonaRetriever search; hits are kept as an immutable tuple."""
+    return tuple(_INSTANCES[key]._search(query, k=k, initial=initial, lambda_mmr=lambda_mmr))
+
+def clear_cache():
+    """Drop memoized retrieval results (e.g. when the UI clears its history)."""
+    _cached_search.cache_clear()
 
 # ---- retriever ----------------------------------------------------------------
 class PersonaRetriever:
     """
     Persona-scoped retriever.
     Looks for:
-      data/processed/personas/{persona}/{persona}.meta.jsonl   (required)
+      data/processed/personas/{persona}/{persona}.meta.feather (preferred) or .meta.jsonl
       data/processed/personas/{persona}/{persona}.faiss        (optional)
+      data/processed/personas/{persona}/{persona}.vecs.npy     (optional, MMR vectors)
     Falls back gracefully (and quickly) if FAISS or SBERT is unavailable.
     """
 
@@ -61,19 +120,27 @@ class PersonaRetriever:
         self.name = persona_name
         self.model = None               # lazy SBERT
         self.index = None               # FAISS (optional)
+        self.vecs = None                # (N,d) unit vectors aligned with meta (optional)
         self.meta = []                  # list of dicts
         self._sbert_loaded = False
 
         faiss_path = f"{base}/{persona_name}/{persona_name}.faiss"
+        vecs_path  = f"{base}/{persona_name}/{persona_name}.vecs.npy"
         meta_path  = f"{base}/{persona_name}/{persona_name}.meta.jsonl"
+        feather_path = f"{base}/{persona_name}/{persona_name}.meta.feather"
         # accept legacy filename convention if present
         if not os.path.exists(meta_path):
             legacy = f"{base}/{persona_name}/{persona_name}_meta.jsonl"
             if os.path.exists(legacy):
                 meta_path = legacy
 
-        # load meta (required for any retrieval)
-        if os.path.exists(meta_path):
+        # load meta (required for any retrieval): columnar file skips per-line JSON parsing
+        if feather is not None and os.path.exists(feather_path):
+            try:
+                self.meta = feather.read_table(feather_path, memory_map=True).to_pylist()
+            except Exception:
+                self.meta = []
+        if not self.meta and os.path.exists(meta_path):
             with open(meta_path, "r", encoding="utf-8") as f:
                 for line in f:
                     try:
@@ -85,21 +152,38 @@ class PersonaRetriever:
         # load FAISS index if present
         if os.path.exists(faiss_path):
             try:
-                self.index = faiss.read_index(faiss_path)
+                self.index = load_index(faiss_path)
             except Exception:
                 # keep running without FAISS
                 self.index = None
 
+        # stored embeddings, memory-mapped; only trusted if they line up with meta
+        if self.index is not None and os.path.exists(vecs_path):
+            try:
+                vecs = np.load(vecs_path, mmap_mode="r")
+                if vecs.shape[0] == len(self.meta):
+                    self.vecs = vecs
+            except Exception:
+                self.vecs = None
+
+        # value filters are per-row constants: evaluate them once, not per search
+        self._keep = _quality_mask([h.get("text") for h in self.meta])
+        self._filtered_idx = np.flatnonzero(self._keep)
+        self._filtered = [self.meta[i] for i in self._filtered_idx.tolist()]
+
+        self._key = (base, persona_name, next(_VERSION))
+        _INSTANCES[self._key] = self
+
     # --- internals -------------------------------------------------------------
 
     def _load_model(self):
         """Lazy SBERT init, with optional disable switch for CI."""
         if self._sbert_loaded:
             return
-        if os.getenv("RETRIEVER_DISABLE_SBER T", "").strip():  # allow fast CI
+        if os.getenv("RETRIEVER_DISABLE_SBERT", "").strip():  # allow fast CI
             return
         try:
-            self.model = SentenceTransformer("all-MiniLM-L6-v2")
+            self.model = get_encoder()
             self._sbert_loaded = True
         except Exception:
             # If model fails to load, we will fall back to naive top-k
@@ -107,30 +191,67 @@ class PersonaRetriever:
             self._sbert_loaded = False
 
     def _filter_meta(self):
-        """Apply quick value filters to meta."""
-        out = []
-        for h in self.meta:
-            txt = (h.get("text") or "").strip()
-            if _length_ok(txt) and _informative(txt):
-                out.append(h)
-        return out
+        """Meta rows passing the quick value filters (precomputed in __init__; don't mutate)."""
+        return self._filtered
 
     def _naive_return(self, k: int):
         """Fast path: no embeddings — just return the first k filtered rows."""
         filtered = self._filter_meta()
         return filtered[:k]
 
+    def _rank(self, q: np.ndarray, D: np.ndarray, I: np.ndarray, k: int, lambda_mmr: float):
+        """
+        One FAISS result row -> value filter -> MMR. q (1,d) is the unit query vector,
+        D/I the matching (1,n) rows from `index.search`.
+        """
+        valid = I[0] >= 0
+        cand_idxs, scores = I[0][valid], D[0][valid]
+        keep = self._keep[cand_idxs]
+        kept = cand_idxs[keep]
+        if not len(kept):
+            return []
+        filtered = [{**self.meta[i], "score": s} for i, s in zip(kept.tolist(), scores[keep].tolist())]
+        # nothing to diversify: all candidates fit, or a single near-duplicate is wanted
+        if len(filtered) <= k or (k == 1 and filtered[0]["score"] >= EXACT_HIT):
+            return filtered[:k]
+
+        if self.vecs is not None:
+            emb = np.asarray(self.vecs[kept], dtype=np.float32)  # (m,d), no re-encode
+        else:
+            texts = [(h.get("text") or "").strip() for h in filtered]
+            # no manual length-sort: encode() already orders by length and restores order
+            emb = self.model.encode(texts, batch_size=64, convert_to_numpy=True,
+                                    normalize_embeddings=True, show_progress_bar=False
+                                    ).astype(np.float32, copy=False)  # (m,d)
+        sel = _mmr(q[0], emb, lambda_mult=lambda_mmr, k=min(k, len(filtered)))
+        return [filtered[i] for i in sel]
+
     # --- public ---------------------------------------------------------------
 
     def search(self, query: str, k: int = 3, initial: int = 50, lambda_mmr: float = 0.7):
+        """
+        Memoized front for `_search`: repeated (persona, query, k) lookups within a
+        process skip the embedding + ANN work; queries differing only in case or
+        spacing share an entry. Returns fresh dict copies so callers can't mutate
+        cached hits.
+        """
+        hits = _cached_search(self._key, _normalize_query(query), k, initial, lambda_mmr)
+        return [dict(h) for h in hits]
+
+    def _search(self, query: str, k: int = 3, initial: int = 50, lambda_mmr: float = 0.7):
         """
         Return up to k diverse, informative lines for this persona.
-        - If FAISS index is available, do ANN -> filter -> re-embed -> MMR
+        - If at most k lines pass the filters, return them as-is
+        - If FAISS index is available, do ANN -> filter -> MMR (tiny personas with
+          stored vectors score every line directly instead)
         - Else, try SBERT-only MMR on a capped subset
         - Else, naive top-k filtered
         """
         if not self.meta:
             return []
+        # tiny personas: every usable line fits in k, nothing to rank
+        if len(self._filtered) <= k:
+            return list(self._filtered)
 
         # FAISS path
         if self.index is not None:
@@ -139,28 +260,16 @@ class PersonaRetriever:
                 # If SBERT didn't load, at least return naive filtered
                 return self._naive_return(k)
 
-            q = self.model.encode([query], convert_to_numpy=True)
-            q = q / (np.linalg.norm(q, axis=1, keepdims=True) + 1e-12)  # (1,d)
-            n = min(initial, len(self.meta))
-            D, I = self.index.search(q.astype(np.float32), n)
-            cand_idxs = [int(i) for i in I[0] if i >= 0]
-
-            filtered, texts = [], []
-            for idx, score in zip(cand_idxs, D[0].tolist()):
-                h = self.meta[idx]
-                txt = (h.get("text") or "").strip()
-                if not _length_ok(txt) or not _informative(txt):
-                    continue
-                filtered.append({**h, "score": float(score)})
-                texts.append(txt)
-
-            if not filtered:
-                return []
-
-            emb = self.model.encode(texts, convert_to_numpy=True)
-            emb = emb / (np.linalg.norm(emb, axis=1, keepdims=True) + 1e-12)  # (m,d)
-            sel = _mmr(q[0], emb, lambda_mult=lambda_mmr, k=min(k, len(filtered)))
-            return [filtered[i] for i in sel]
+            q = encode_query(self.model, query)  # (1,d)
+            if self.vecs is not None and len(self._filtered) <= min(SMALL_PERSONA, initial):
+                # a handful of rows: exact scores + MMR in numpy beat an ANN round-trip
+                emb = np.asarray(self.vecs[self._filtered_idx], dtype=np.float32)
+                scores = (emb @ q[0]).tolist()
+                hits = [{**h, "score": s} for h, s in zip(self._filtered, scores)]
+                sel = _mmr(q[0], emb, lambda_mult=lambda_mmr, k=k)
+                return [hits[i] for i in sel]
+            D, I = _ann_search(self.index, q, min(initial, len(self.meta)))
+            return self._rank(q, D, I, k, lambda_mmr)
 
         # SBERT-only path (no FAISS)
         filtered = self._filter_meta()
@@ -178,12 +287,13 @@ class PersonaRetriever:
                 return pool[:k]
 
             texts = [(h.get("text") or "").strip() for h in pool]
-            q = self.model.encode([query], convert_to_numpy=True)
-            q = q / (np.linalg.norm(q, axis=1, keepdims=True) + 1e-12)
-            emb = self.model.encode(texts, convert_to_numpy=True)
-            emb = emb / (np.linalg.norm(emb, axis=1, keepdims=True) + 1e-12)
+            # query + candidates in one padded batch; row 0 is the query
+            embs = self.model.encode([query] + texts, batch_size=64, convert_to_numpy=True,
+                                     normalize_embeddings=True, show_progress_bar=False
+                                     ).astype(np.float32, copy=False)
+            q, emb = embs[:1], embs[1:]
             sel = _mmr(q[0], emb, lambda_mult=lambda_mmr, k=min(k, len(pool)))
             return [pool[i] for i in sel]
         except Exception:
             # absolute last resort
-            return pool[:k]
\ No newline at end of file
+            return pool[:k]
@@ -1,6 +1,20 @@
+from pathlib import Path
 import pandas as pd
 
-for i in [0, 1, 2]:
-    df = pd.read_csv(f"data/processed/personas/persona_{i}.csv")
-    print(f"\n--- persona_{i} sample ---")
-    print("\n".join(df["text"].dropna().sample(10, random_state=42).tolist()))
+PERSONA_DIR = Path("data/processed/personas")
+PARQUET = PERSONA_DIR / "personas.parquet"
+
+if PARQUET.exists():
+    # one columnar read of just the two columns needed, then sample per persona
+    df = pd.read_parquet(PARQUET, columns=["persona", "text"])
+else:
+    # older builds: one CSV per persona
+    df = pd.concat(
+        [pd.read_csv(p, usecols=["text"]).assign(persona=p.stem) for p in sorted(PERSONA_DIR.glob("*.csv"))],
+        ignore_index=True,
+    )
+
+for persona, g in df.groupby("persona", sort=False):
+    texts = g["text"].dropna()
+    print(f"\n--- {persona} sample ---")
+    print("\n".join(texts.sample(min(10, len(texts)), random_state=42).tolist()))
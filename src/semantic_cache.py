@@ -0,0 +1,164 @@
+# src/semantic_cache.py
+import os
+import pickle
+import logging
+import threading
+import faiss
+import numpy as np
+
+from src.embed_model import encode_query, get_encoder
+
+log = logging.getLogger(__name__)
+
+# entries kept per cache; past it the oldest tenth is evicted (<= 0: unbounded)
+MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+
+
+class SemanticCache:
+    """
+    Query-level semantic cache (GPTCache-style).
+    - get(query): embed the raw query, find the nearest cached query in a FAISS
+      inner-product index, return its stored result if cosine >= threshold.
+    - put(query, result): remember the result; appended to `path` when given so
+      paraphrased re-asks survive restarts. At most `max_entries` are kept
+      (oldest first out); the file is only rewritten when entries are evicted.
+    Falls back to "always miss" if SBERT is unavailable.
+    """
+
+    def __init__(self, path: str | None = None, threshold: float | None = None,
+                 model_name: str = "all-MiniLM-L6-v2", max_entries: int = MAX_ENTRIES):
+        self.path = path
+        if threshold is None:
+            threshold = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.93"))
+        self.threshold = threshold
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.model = None               # lazy SBERT
+        self._model_loaded = False
+        self.index = None               # FAISS IndexFlatIP, built on first put/load
+        self.queries: list[str] = []
+        self.vecs: list[np.ndarray] = []
+        self.results: list[dict] = []
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if path and os.path.exists(path):
+            dirty = False
+            try:
+                for q, v, r in self._read_log(path):
+                    self._add(q, v, r)
+            except Exception:
+                # a torn/corrupt record should never block the app: keep what loaded
+                log.warning("semantic cache %s is damaged; keeping %d entries", path, len(self.queries))
+                dirty = True
+            if self._evict() or dirty:
+                try:
+                    self._save()
+                except Exception:
+                    pass
+
+    # --- internals -------------------------------------------------------------
+
+    def _load_model(self):
+        if self._model_loaded:
+            return
+        try:
+            self.model = get_encoder(self.model_name)
+            self._model_loaded = True
+        except Exception:
+            self.model = None
+
+    def _embed(self, query: str) -> np.ndarray | None:
+        self._load_model()
+        if not self.model:
+            return None
+        # shared memo: get() and put() of every per-agent cache embed the same query
+        return encode_query(self.model, query)[0].copy()
+
+    def _add(self, query: str, vec: np.ndarray, result: dict):
+        if self.index is None:
+            self.index = faiss.IndexFlatIP(vec.shape[0])
+        self.index.add(vec.reshape(1, -1))
+        self.queries.append(query)
+        self.vecs.append(vec)
+        self.results.append(result)
+
+    def _evict(self) -> bool:
+        """Drop the oldest tenth once over `max_entries` and rebuild the index (amortized)."""
+        if self.max_entries <= 0 or len(self.queries) <= self.max_entries:
+            return False
+        keep = self.max_entries - self.max_entries // 10
+        self.queries, self.vecs, self.results = self.queries[-keep:], self.vecs[-keep:], self.results[-keep:]
+        self.index = faiss.IndexFlatIP(self.vecs[0].shape[0])
+        self.index.add(np.stack(self.vecs))
+        return True
+
+    @staticmethod
+    def _read_log(path: str):
+        """Yield (query, vec, result) records in insertion order."""
+        with open(path, "rb") as f:
+            while True:
+                try:
+                    rec = pickle.load(f)
+                except EOFError:
+                    return
+                if isinstance(rec, dict):  # whole-cache snapshot written by older versions
+                    yield from zip(rec["queries"], rec["vecs"], rec["results"])
+                else:
+                    yield rec
+
+    def _append(self, query: str, vec: np.ndarray, result: dict):
+        """Persist one entry in O(1): pickle records are appended back to back."""
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "ab") as f:
+            pickle.dump((query, vec, result), f)
+
+    def _save(self):
+        """Rewrite the whole log (after eviction or a damaged load)."""
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "wb") as f:
+            for rec in zip(self.queries, self.vecs, self.results):
+                pickle.dump(rec, f)
+        os.replace(tmp, self.path)
+
+    # --- public ---------------------------------------------------------------
+
+    def get(self, query: str) -> dict | None:
+        """Return a cached result for a near-duplicate query, else None."""
+        vec = self._embed(query)
+        with self._lock:
+            if vec is None or self.index is None or self.index.ntotal == 0:
+                self.misses += 1
+                return None
+            D, I = self.index.search(vec.reshape(1, -1), 1)
+            score, idx = float(D[0][0]), int(I[0][0])
+            if idx < 0 or score < self.threshold:
+                self.misses += 1
+                log.info("semantic cache miss (best=%.3f, hits=%d, misses=%d)", score, self.hits, self.misses)
+                return None
+            self.hits += 1
+            log.info("semantic cache hit (%.3f ~ %r, hits=%d, misses=%d)",
+                     score, self.queries[idx], self.hits, self.misses)
+            return self.results[idx]
+
+    def put(self, query: str, result: dict) -> None:
+        """Store `result` under the query's embedding (no-op without SBERT)."""
+        vec = self._embed(query)
+        if vec is None:
+            return
+        with self._lock:
+            self._add(query, vec, result)
+            try:
+                if self._evict():
+                    self._save()
+                else:
+                    self._append(query, vec, result)
+            except Exception:
+                # persistence is best-effort; the in-memory cache still works
+                pass
@@ -24,4 +24,49 @@ def test_dramatist_evocative(patch_retriever, patch_llm):
     r = a.respond("what happened?")
     assert "SCENE" in r["response"]
     # dramatist shouldn’t sound like advice
-    assert "GUIDANCE" not in r["response"]
\ No newline at end of file
+    assert "GUIDANCE" not in r["response"]
+
+def test_rationalist_challenge_many_parses_json_and_headers(patch_retriever, monkeypatch):
+    import src.agents.rationalist as rationalist_mod
+    a = RationalistAgent()
+    targets = {"commander": "Ship it now.", "dramatist": "Feel the weight first."}
+
+    monkeypatch.setattr(rationalist_mod, "chat",
+        lambda *args, **kwargs: '{"commander": "CHALLENGE: deadline?", "dramatist": "CHALLENGE: mood?"}')
+    out = a.challenge_many(targets)
+    assert out["commander"]["response"] == "CHALLENGE: deadline?"
+    assert out["dramatist"]["response"] == "CHALLENGE: mood?"
+
+    monkeypatch.setattr(rationalist_mod, "chat",
+        lambda *args, **kwargs: "Commander: CHALLENGE one.\nDramatist: CHALLENGE two.")
+    out = a.challenge_many(targets)
+    assert out["commander"]["response"] == "CHALLENGE one."
+    assert out["dramatist"]["response"] == "CHALLENGE two."
+
+def test_thread_utils_read_bounded_deque():
+    from collections import deque
+    from src.agents._thread_utils import recent_as_text, last_other_speaker
+    recent = deque(maxlen=3)
+    for spk, msg in [("Commander", "a"), ("Rationalist", "b"), ("Dramatist", "c"), ("Commander", "d\ne")]:
+        recent.append({"speaker": spk, "message": msg})
+    assert recent_as_text(recent) == "Rationalist: b\nDramatist: c\nCommander: d\ne"
+    assert recent_as_text(recent, n=1, clip_to=220) == "Commander: d e"
+    assert last_other_speaker(recent, me="Commander") == "Dramatist"
+
+def test_respond_uses_per_agent_cache(patch_retriever, monkeypatch):
+    import src.agents.commander as commander_mod
+    # the agent imported `chat` by name, so patch it where it's looked up
+    monkeypatch.setattr(commander_mod, "chat", lambda *args, **kwargs: "GUIDANCE: stay calm; lead.")
+
+    class DictCache:
+        def __init__(self): self.store = {}
+        def get(self, q): return self.store.get(q)
+        def put(self, q, r): self.store[q] = r
+
+    cache = DictCache()
+    a = CommanderAgent(cache=cache)
+    first = a.respond("should I quit my job?")
+    assert cache.store["should I quit my job?"]["response"] == first["response"]
+
+    cache.store["should I quit my job?"] = {"response": "CACHED", "citations": "", "hits": []}
+    assert a.respond("should I quit my job?")["response"] == "CACHED"
@@ -0,0 +1,42 @@
+# tests/test_preprocessing.py
+import pytest
+from src import preprocessing
+from src.preprocessing import COLUMNS, load_movie_lines, _load_movie_lines_py
+
+RAW = (
+    "lineID\tcharacterID\tmovieID\tcharacter\ttext\n"
+    "L1\tu1\tm1\tIAN\tFirst line.\n"
+    "L2\tu2\tm1\tRICKY\tHas\ta tab inside\n"
+    "short\trow\n"
+    "L3\tu3\tm2\tMARTINS\t   \n"
+    "L4\tu1\tm1\tIAN\tLast line.\n"
+)
+
+
+@pytest.fixture
+def lines_tsv(tmp_path):
+    path = tmp_path / "movie_lines.tsv"
+    path.write_text(RAW, encoding="utf-8")
+    return str(path)
+
+
+def test_python_reader_rejoins_tabbed_text(lines_tsv):
+    df = _load_movie_lines_py(lines_tsv)
+    assert list(df.columns) == COLUMNS
+    assert df["line_id"].tolist() == ["L1", "L2", "L3", "L4"]
+    assert df.loc[1, "text"] == "Has\ta tab inside"
+
+
+def test_load_movie_lines_keeps_file_order(lines_tsv):
+    df = load_movie_lines(lines_tsv)
+    # header and short row skipped, blank text dropped, tabbed row stays in place
+    assert df["line_id"].tolist() == ["L1", "L2", "L4"]
+    assert df.loc[1, "text"] == "Has\ta tab inside"
+
+
+def test_arrow_reader_matches_python_reader(lines_tsv):
+    if preprocessing.pacsv is None:
+        pytest.skip("pyarrow not installed")
+    arrow = preprocessing._read_tsv_arrow(lines_tsv)
+    py = _load_movie_lines_py(lines_tsv)
+    assert arrow.to_dict("list") == py.to_dict("list")
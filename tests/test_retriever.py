@@ -7,4 +7,15 @@ def test_retriever_returns_hits():
     assert isinstance(hits, list)
     assert len(hits) > 0
     assert "text" in hits[0]
-    assert "line_id" in hits[0]
\ No newline at end of file
+    assert "line_id" in hits[0]
+
+def test_mmr_prefers_diverse_candidates():
+    import numpy as np
+    from src.retriever import _mmr
+    q = np.array([1.0, 0.0], dtype=np.float32)
+    cands = np.array([[1.0, 0.0], [0.99, 0.141], [0.6, 0.8]], dtype=np.float32)
+    cands /= np.linalg.norm(cands, axis=1, keepdims=True)
+    # near-duplicate of the first pick loses to the more diverse candidate
+    assert _mmr(q, cands, lambda_mult=0.3, k=2) == [0, 2]
+    assert _mmr(q, cands, lambda_mult=1.0, k=3) == [0, 1, 2]
+    assert _mmr(q, cands[:0], k=3) == []
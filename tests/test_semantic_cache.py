@@ -0,0 +1,43 @@
+# tests/test_semantic_cache.py
+import numpy as np
+from src.semantic_cache import SemanticCache
+
+VECS = {
+    "should i quit my job?":               [1.0, 0.0, 0.0],
+    "should i resign from my position?":  [0.98, 0.2, 0.0],
+    "how do i bake bread?":                [0.0, 0.0, 1.0],
+}
+
+class FakeModel:
+    def encode(self, texts, convert_to_numpy=True, **kw):
+        return np.array([VECS[t.lower()] for t in texts], dtype=np.float32)
+
+def _cache(**kw):
+    c = SemanticCache(**kw)
+    c.model, c._model_loaded = FakeModel(), True
+    return c
+
+def test_hit_on_paraphrase_and_miss_on_unrelated():
+    c = _cache(threshold=0.9)
+    assert c.get("Should I quit my job?") is None
+    c.put("Should I quit my job?", {"synthesis": {"response": "cached"}})
+    assert c.get("Should I resign from my position?")["synthesis"]["response"] == "cached"
+    assert c.get("How do I bake bread?") is None
+    assert c.hits == 1 and c.misses == 2
+
+def test_persists_across_instances(tmp_path):
+    path = str(tmp_path / "cache.pkl")
+    _cache(path=path, threshold=0.9).put("Should I quit my job?", {"x": 1})
+    assert _cache(path=path, threshold=0.9).get("Should I quit my job?") == {"x": 1}
+
+def test_evicts_oldest_past_max_entries(tmp_path):
+    path = str(tmp_path / "cache.pkl")
+    c = _cache(path=path, threshold=0.99, max_entries=2)
+    c.put("Should I quit my job?", {"x": 1})
+    c.put("How do I bake bread?", {"x": 2})
+    c.put("Should I resign from my position?", {"x": 3})
+    assert len(c.queries) == 2 and c.index.ntotal == 2
+    assert c.get("Should I quit my job?") is None
+    reloaded = _cache(path=path, threshold=0.99, max_entries=2)
+    assert reloaded.get("How do I bake bread?") == {"x": 2}
+    assert reloaded.get("Should I resign from my position?") == {"x": 3}